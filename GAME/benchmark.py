@@ -0,0 +1,253 @@
+"""
+Microbenchmarks for the parts of the game that run every frame: tilemap drawing and lookups,
+entity physics, particles and the final upscale to the window.
+
+runs with no window (SDL's dummy driver), against every map in data/maps plus big generated ones.
+    python benchmark.py                             everything
+    python benchmark.py --filter render             only benchmarks with 'render' in the name
+    python benchmark.py --save baseline.json        keep the results to compare against later
+    python benchmark.py --compare baseline.json     flag anything that got slower than the baseline
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import pygame
+
+from game import Game
+from scripts.tilemap import Tilemap
+from scripts.entities import Enemy, Player
+from scripts.particle import ParticleSystem
+
+MAP_DIR = 'data/maps/'
+SYNTHETIC_SIZES = [(256, 64), (1024, 256)]      # generated maps, in tiles wide by tiles high.
+DISPLAY_SIZE = (455, 270)
+SCREEN_SIZE = (1920, 1080)
+
+
+def synthetic_map(game, width, height, seed=0):
+    """
+    a big made up level: solid ground, stone underneath, floating platforms and decorations on top.
+    """
+    rng = random.Random(seed)
+    tilemap = Tilemap(game, tile_size=16)
+    ground = height // 2
+    for x in range(width):
+        ground = max(4, min(height - 4, ground + rng.choice((-1, 0, 0, 0, 1))))
+        tilemap.store.set(x, ground, 'grass', 1)
+        for y in range(ground + 1, height):
+            tilemap.store.set(x, y, 'stone', 8)
+        if rng.random() < 0.08:
+            tilemap.offgrid_tiles.append({'type': 'decor', 'variant': rng.randint(0, 3), 'pos': [x * 16.0, ground * 16.0 - 16]})
+        if rng.random() < 0.05:
+            for i in range(rng.randint(2, 6)):
+                tilemap.store.set(x + i, ground - rng.randint(4, 7), 'grass', 1)
+    tilemap.autotile()
+    tilemap.rebuild_solids()
+    tilemap.reindex_offgrid()
+    tilemap.mark_all_dirty()
+    return tilemap
+
+
+def solid_spots(tilemap, count, rng):
+    """
+    pixel positions just above solid ground, for putting entities where they'd actually be.
+    """
+    tops = [loc for loc in tilemap.solid_rects if (loc[0], loc[1] - 1) not in tilemap.solid_rects and (loc[0], loc[1] - 2) not in tilemap.solid_rects]
+    tops.sort()
+    return [(loc[0] * tilemap.tile_size + 2, loc[1] * tilemap.tile_size - 14) for loc in rng.sample(tops, min(count, len(tops)))]
+
+
+def measure(fn, min_time=0.2, repeats=5):
+    """
+    time fn() in batches big enough to take min_time, returns the best seconds per call over the repeats.
+    best, not mean, because anything slower than the best is the machine getting in the way.
+    """
+    fn()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats:
+            break
+        calls *= 2
+    best = elapsed / calls
+    for r in range(repeats - 1):
+        start = time.perf_counter()
+        for i in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def camera_path(tilemap, frames=64):
+    """
+    offsets sweeping across the map, so render and lookups see a moving camera like in game.
+    """
+    xs = [x for x, y in tilemap.solid_rects] or [0]
+    ys = [y for x, y in tilemap.solid_rects] or [0]
+    left, right = min(xs) * tilemap.tile_size, max(xs) * tilemap.tile_size
+    middle = (sum(ys) // len(ys)) * tilemap.tile_size - DISPLAY_SIZE[1] // 2
+    return [(int(left + (right - left) * i / frames), middle) for i in range(frames)]
+
+
+def tilemap_benchmarks(name, game, tilemap, rng):
+    """
+    {benchmark name: (function, calls it makes)} for one map, the time per call is the function's time divided by calls.
+    """
+    benchmarks = {}
+    display = pygame.Surface(DISPLAY_SIZE)
+    path = camera_path(tilemap)
+    step = [0]
+
+    def render():
+        step[0] = (step[0] + 1) % len(path)
+        tilemap.render(display, offset=path[step[0]])
+    benchmarks[name + '/tilemap.render'] = (render, 1)
+
+    def render_cold():
+        tilemap.mark_all_dirty()
+        render()
+    benchmarks[name + '/tilemap.render_cold'] = (render_cold, 1)
+
+    spots = solid_spots(tilemap, 64, rng) or [(0, 0)]
+
+    def tiles_around():
+        for spot in spots:
+            tilemap.tiles_around(spot, (12, 29))
+    benchmarks[name + '/tilemap.tiles_around'] = (tiles_around, len(spots))
+
+    def physics_rects_around():
+        for spot in spots:
+            tilemap.physics_rects_around(spot, (12, 29))
+    benchmarks[name + '/tilemap.physics_rects_around'] = (physics_rects_around, len(spots))
+
+    def solid_check():
+        for spot in spots:
+            tilemap.solid_check((spot[0], spot[1] + 23))
+    benchmarks[name + '/tilemap.solid_check'] = (solid_check, len(spots))
+
+    # entity physics on this map: a crowd of enemies and a player standing on real ground.
+    enemies = [Enemy(game, spot, (8, 12)) for spot in spots]
+    player = Player(game, spots[0], (12, 29))
+
+    def enemy_update():
+        game.player = player
+        for enemy in enemies:
+            enemy.update(tilemap, (0, 0))
+        game.sparks.clear()             # enemies shoot now and then, don't let the effects pile up between calls.
+        game.projectiles.clear()
+    benchmarks[name + '/Enemy.update'] = (enemy_update, len(enemies))
+
+    def player_update():
+        player.update(tilemap, (1, 0))
+        if player.pos[1] > 10000:           # fell out of the map, put it back so we keep measuring collisions not free fall.
+            player.place(spots[0])
+    benchmarks[name + '/PhysicsEntity.update'] = (player_update, 1)
+    return benchmarks
+
+
+def particle_benchmarks(game, counts=(1000, 10000)):
+    benchmarks = {}
+    display = pygame.Surface(DISPLAY_SIZE)
+    for count in counts:
+        particles = ParticleSystem(game, capacity=count)
+        rng = random.Random(count)
+
+        def update(particles=particles, rng=rng, count=count):
+            while len(particles) < count:           # top back up with whatever died last frame so the count stays steady.
+                particles.spawn(rng.choice(('leaf', 'particle')), (rng.random() * DISPLAY_SIZE[0], rng.random() * DISPLAY_SIZE[1]), velocity=(rng.random() - 0.5, rng.random() - 0.5), frame=rng.randint(0, 7))
+            particles.update()
+        benchmarks['particles/' + str(count) + '/ParticleSystem.update'] = (update, 1)
+
+        def render(particles=particles, update=update):
+            if not len(particles):
+                update()
+            particles.render(display)
+        benchmarks['particles/' + str(count) + '/ParticleSystem.render'] = (render, 1)
+    return benchmarks
+
+
+def present_benchmarks(game):
+    display = pygame.Surface(DISPLAY_SIZE)
+    screen = pygame.Surface(SCREEN_SIZE)
+
+    def present():
+        screen.blit(pygame.transform.scale(display, screen.get_size()), (0, 0))
+    return {'present/transform.scale': (present, 1)}
+
+
+def run_benchmarks(name_filter=None):
+    game = Game(headless=True, seed=0)
+    rng = random.Random(0)
+    benchmarks = {}
+    for map_file in sorted(os.listdir(MAP_DIR)):
+        if map_file.endswith('.json'):
+            map_id = map_file[:-len('.json')]
+            game.load_level(map_id)
+            tilemap = game.tilemap
+            game.tilemap = Tilemap(game, tile_size=16)     # the next load_level gets a fresh one, this one stays as it is for its benchmarks.
+            benchmarks.update(tilemap_benchmarks(map_id, game, tilemap, rng))
+    for width, height in SYNTHETIC_SIZES:
+        benchmarks.update(tilemap_benchmarks('synthetic_' + str(width) + 'x' + str(height), game, synthetic_map(game, width, height), rng))
+    benchmarks.update(particle_benchmarks(game))
+    benchmarks.update(present_benchmarks(game))
+
+    results = {}
+    for name, (fn, calls) in benchmarks.items():
+        if not name_filter or name_filter in name:
+            results[name] = measure(fn) / calls
+    return results
+
+
+def report(results, baseline=None, threshold=0.15):
+    """
+    print a table of ops/sec and milliseconds per call, returns the names that got slower than baseline by more than threshold.
+    """
+    regressions = []
+    if not results:
+        print('no benchmarks matched')
+        return regressions
+    width = max(len(name) for name in results)
+    for name, seconds in results.items():
+        line = name.ljust(width) + '  ' + format(1 / seconds, '12.1f') + ' ops/s  ' + format(seconds * 1000, '10.4f') + ' ms'
+        if baseline and name in baseline:
+            change = seconds / baseline[name] - 1
+            line += '  ' + format(change * 100, '+7.1f') + '%'
+            if change > threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='time the per frame hot spots of the game with no window.')
+    parser.add_argument('--filter', default=None, help='only run benchmarks whose name contains this')
+    parser.add_argument('--save', default=None, help='write the results to this json file')
+    parser.add_argument('--compare', default=None, help='baseline json from --save to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='how much slower than baseline counts as a regression, 0.15 is 15%%')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter)
+    baseline = None
+    if args.compare:
+        f = open(args.compare, 'r')
+        baseline = json.load(f)['results']
+        f.close()
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        f = open(args.save, 'w')
+        json.dump({'pygame': pygame.version.ver, 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        f.close()
+    if regressions:
+        print(str(len(regressions)) + ' benchmark(s) slower than the baseline')
+        sys.exit(1)
@@ -1,21 +1,26 @@
 import sys
+import argparse
 
 import pygame
 
 from scripts.utils import load_images
-from scripts.tilemap import Tilemap
+from scripts.tilemap import Tilemap, CHUNK_SIZE
+from scripts.brushes import line_cells, rect_cells, flood_cells
+from scripts.saving import MapSaver
+from scripts.present import make_presenter, SCALE_MODES, BACKENDS
 
 RENDER_SCALE = 2.0
+MAP_PATH = 'data/maps/02.json'
+BRUSHES = {pygame.K_1: 'pencil', pygame.K_2: 'line', pygame.K_3: 'rect', pygame.K_4: 'flood'}
+MAX_DIRTY_RECTS = 8         # past this many changed areas in a frame, just redraw the one rect around all of them.
 
 
 class Editor:
-    def __init__(self):
+    def __init__(self, renderer='auto', scale_mode='stretch'):
         pygame.init()
 
-        pygame.display.set_caption('editor')
-
-        # Create Game Window with resolution, display is to render onto smaller screen, then scale to the larger screen.
-        self.screen = pygame.display.set_mode((640, 480))
+        # Create Game Window with resolution, display is to render onto smaller screen, then the presenter scales it to the larger window (scripts/present.py).
+        self.presenter = make_presenter(renderer, 'editor', (int(320 * RENDER_SCALE), int(240 * RENDER_SCALE)), (320, 240), scale_mode)
         self.display = pygame.Surface((320, 240))      # all black by default
         # Set game clock to run at 60fps, need to do
         # to prevent overtaxing processor, not using
@@ -39,10 +44,15 @@ class Editor:
 
         self.tilemap = Tilemap(self, tile_size=16)
 
+        self.map_path = MAP_PATH        # o saves back over the map that was loaded.
         try:
-            self.tilemap.load('data/maps/02.json')
+            self.tilemap.load(self.map_path)
         except FileNotFoundError:
             pass
+        self.saver = MapSaver(self.tilemap, self.map_path)
+        recovered = self.saver.recover()        # edits a crash left in the journal.
+        if recovered:
+            print('recovered ' + str(recovered) + ' unsaved edits to ' + self.map_path + ', press o to keep them')
 
         self.scroll = [0, 0]        # "camera's" location
 
@@ -55,58 +65,177 @@ class Editor:
         self.shift = False
         self.ongrid = True
 
+        self.brush = 'pencil'           # 1 pencil, 2 line, 3 rectangle, 4 flood fill.
+        self.brush_start = None         # tile the mouse went down on, line and rectangle fill from here to where it comes up.
+        self.last_painted = None        # the pencil only sets a tile once while the mouse is held on it, not every frame.
+        self.ghosts = {}                # (type, variant) -> see-through copy of the tile image for the preview, made once.
+
+        # the map is drawn into self.view and only the parts of it that change are redrawn,
+        # then only the parts of the window that changed are scaled up and updated.
+        self.view = pygame.Surface(self.display.get_size())
+        self.view_scroll = None         # the scroll self.view was drawn at, None to redraw all of it.
+        self.changed = []               # world space rects of the map that changed since the last frame.
+        self.overlays = []              # what was drawn over the map last frame, (image, position) pairs.
+        self.tilemap.changed_chunks = set()
+
+    def ghost(self, tile_type, variant):
+        if (tile_type, variant) not in self.ghosts:
+            img = self.assets[tile_type][variant].copy()
+            img.set_alpha(100)          # makes image partially transparent, 0 is fully transparent, 255 is fully opaque.
+            self.ghosts[(tile_type, variant)] = img
+        return self.ghosts[(tile_type, variant)]
+
+    def eraser(self):
+        if None not in self.ghosts:
+            img = pygame.Surface((self.tilemap.tile_size, self.tilemap.tile_size))
+            img.fill((255, 0, 0))
+            img.set_alpha(100)
+            self.ghosts[None] = img
+        return self.ghosts[None]
+
+    def paint(self, cells):
+        changed = self.tilemap.set_tiles(cells, self.tile_list[self.tile_group], self.tile_variant)     # marks each chunk dirty once, however many tiles went in.
+        self.saver.record_tiles(changed + self.tilemap.autotile_tiles(changed))        # and fix up the variants of them and their neighbors.
+
+    def erase(self, cells):
+        changed = self.tilemap.remove_tiles(cells)
+        self.saver.record_tiles(changed + self.tilemap.autotile_tiles(changed))
+
+    def draw(self, render_scroll, overlays):
+        """
+        bring the window up to date touching as little as possible: the map only where tiles changed (and the strip
+        that scrolled into view when the camera moved), the previews only when they moved.
+        """
+        display_rect = self.display.get_rect()
+        dirty = []
+        if self.view_scroll is not None and render_scroll != self.view_scroll:
+            dx, dy = render_scroll[0] - self.view_scroll[0], render_scroll[1] - self.view_scroll[1]
+            if abs(dx) < display_rect.width and abs(dy) < display_rect.height:
+                self.view.scroll(-dx, -dy)          # move what's already drawn, then only draw the new strips.
+                if dx:
+                    self.changed.append(pygame.Rect(render_scroll[0] + (display_rect.width - dx if dx > 0 else 0), render_scroll[1], abs(dx), display_rect.height))
+                if dy:
+                    self.changed.append(pygame.Rect(render_scroll[0], render_scroll[1] + (display_rect.height - dy if dy > 0 else 0), display_rect.width, abs(dy)))
+                self.view_scroll = render_scroll
+                dirty.append(display_rect)
+            else:
+                self.view_scroll = None
+        if self.view_scroll is None:
+            self.view.fill((0, 0, 0))
+            self.tilemap.render(self.view, offset=render_scroll)
+            self.view_scroll = render_scroll
+            self.changed = []
+            self.tilemap.changed_chunks.clear()
+            dirty.append(display_rect)
+
+        chunk_px = CHUNK_SIZE * self.tilemap.tile_size
+        overhang = self.tilemap.tile_overhang()
+        for cx, cy in self.tilemap.changed_chunks:
+            self.changed.append(pygame.Rect(cx * chunk_px, cy * chunk_px, chunk_px + overhang[0], chunk_px + overhang[1]))
+        self.tilemap.changed_chunks.clear()
+        for rect in self.changed:
+            rect = rect.move(-render_scroll[0], -render_scroll[1]).clip(display_rect)
+            if rect:
+                self.view.set_clip(rect)            # render still goes over everything on screen, but only pixels in here get written.
+                self.view.fill((0, 0, 0))
+                self.tilemap.render(self.view, offset=render_scroll)
+                dirty.append(rect)
+        self.view.set_clip(None)
+        self.changed = []
+
+        if overlays != self.overlays:
+            for img, pos in self.overlays + overlays:
+                dirty.append(img.get_rect(topleft=(int(pos[0]), int(pos[1]))).inflate(2, 2).clip(display_rect))
+            self.overlays = overlays
+        dirty = [rect for rect in dirty if rect]
+        if not dirty:
+            return
+        if len(dirty) > MAX_DIRTY_RECTS:
+            dirty = [dirty[0].unionall(dirty[1:])]
+
+        for rect in dirty:
+            self.display.set_clip(rect)         # the previews are see through, they must only be drawn over fresh map or they'd get darker every frame.
+            self.display.blit(self.view, rect, rect)
+            self.display.blits(overlays, doreturn=False)
+        self.display.set_clip(None)
+        self.presenter.present(self.display, rects=dirty)          # scale display and show it, just the parts that changed.
+
     def run(self):
 
         while True:
-            self.display.fill((0, 0, 0))        # draw screen to prevent trails of moving images.
-
             self.scroll[0] += (self.movement[1] - self.movement[0]) * 2
-            self.scroll[1] += (self.movement[3] - self.movement[2]) * 2     
+            self.scroll[1] += (self.movement[3] - self.movement[2]) * 2
             render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+            tile_size = self.tilemap.tile_size
 
-            self.tilemap.render(self.display, offset=render_scroll)
-
-            current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
-            current_tile_img.set_alpha(100)         # makes image partially transparent, 0 is fully transparent, 255 is fully opaque.
+            current_tile_img = self.ghost(self.tile_list[self.tile_group], self.tile_variant)
 
             mpos = pygame.mouse.get_pos()               # gives pixel coordinates of mouse with respect to the window.
-            mpos = (mpos[0] / RENDER_SCALE, mpos[1] / RENDER_SCALE)         # SCALE DOWN mouse position to get correct coordinates since we are "two pixels" now.
-            tile_pos = (int((mpos[0] + self.scroll[0]) // self.tilemap.tile_size), int((mpos[1] + self.scroll[1]) // self.tilemap.tile_size))           # gives us coordinates of our mouse in terms of the tile system.
+            mpos = self.presenter.to_display(mpos)      # SCALE DOWN mouse position to get correct coordinates since we are "two pixels" now.
+            tile_pos = (int((mpos[0] + self.scroll[0]) // tile_size), int((mpos[1] + self.scroll[1]) // tile_size))           # gives us coordinates of our mouse in terms of the tile system.
                                                         # the division here aligns tiles with the grid
 
+            if self.brush == 'pencil' or not self.ongrid:
+                if self.clicking and self.ongrid and tile_pos != self.last_painted:
+                    self.paint([tile_pos])              # place tile if clicking.
+                if self.right_clicking:                          # delete tiles
+                    if tile_pos != self.last_painted:
+                        self.erase([tile_pos])
+                    # for deleting off-grid tiles, the tilemap's index only checks the tiles near the mouse. mpos is in display space so add self.scroll to get world space.
+                    for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                        self.changed.append(pygame.Rect(self.tilemap.offgrid_rect(tile)))
+                        self.tilemap.remove_offgrid(tile)
+                        self.saver.record_offgrid_remove(tile)
+                self.last_painted = tile_pos if self.clicking or self.right_clicking else None
+
+            # the preview: the tile under the mouse, or every tile a line or rectangle would cover while it's being dragged out.
+            overlays = []
             if self.ongrid:
-                self.display.blit(current_tile_img, (tile_pos[0] * self.tilemap.tile_size - self.scroll[0], tile_pos[1] * self.tilemap.tile_size - self.scroll[1]))     # we added scroll i.e. camera's position, in tile_pos so we need to remove it here...?
-            # reason we are doing all of this is to align the tiles with the grid.
+                cells = [tile_pos]
+                img = current_tile_img
+                if self.brush_start:
+                    cells = (line_cells if self.brush == 'line' else rect_cells)(self.brush_start, tile_pos)
+                    img = current_tile_img if self.clicking else self.eraser()
+                for x, y in cells:
+                    pos = (x * tile_size - render_scroll[0], y * tile_size - render_scroll[1])      # we added scroll i.e. camera's position, in tile_pos so we need to remove it here.
+                    if -tile_size < pos[0] < self.display.get_width() and -tile_size < pos[1] < self.display.get_height():
+                        overlays.append((img, pos))
             else:
-                self.display.blit(current_tile_img, mpos)       # off grid display            
-
-            if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}      # place tile if clicking, formats into coordinate system of JSON format.
-            if self.right_clicking:                          # delete tiles
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                for tile in self.tilemap.offgrid_tiles.copy():                  # for deleting off-grid tiles, copy is because we are going to delete and we don't want to get the reference itself. This is poorly optimized code.
-                    tile_img = self.assets[tile['type']][tile['variant']]       # computing hit box from the image for deletion
-                    tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())     # calculating the hitbox, we remove self.scroll because we are converting world space into display space because we're trying to collide with the mouse. tile_pos is calculated with self.scroll added to it, so we need to remove it.
-                    if tile_r.collidepoint(mpos):           # this is for colliding rects with any point
-                        self.tilemap.offgrid_tiles.remove(tile)
-
-            self.display.blit(current_tile_img, (5, 5))
+                overlays.append((current_tile_img, mpos))       # off grid display
+            overlays.append((current_tile_img, (5, 5)))
+
+            self.draw(render_scroll, overlays)
+            self.saver.poll()
 
             # prevent computer from thinking program is not responding by constantly querying pygame.event
             for event in pygame.event.get():
-                if event.type == pygame.QUIT:           # pygame.QUIT is clicking X in the window.
+                if event.type in (pygame.QUIT, pygame.WINDOWCLOSE):        # pygame.QUIT is clicking X in the window, the SDL renderer's window sends WINDOWCLOSE.
+                    self.saver.close()                  # let a save that's still being written finish, edits that weren't saved are thrown away.
                     pygame.quit()
                     sys.exit()                          # exit application.
 
+                if event.type == pygame.VIDEOEXPOSE:       # the window was covered up, everything has to be drawn again.
+                    self.view_scroll = None
+                    self.overlays = []
+
                 if event.type == pygame.MOUSEBUTTONDOWN:        # this is for any button activation on the mouse including scroll wheel, mouse buttons are assigned different numbers.
                     if event.button == 1:               # left clicking
                         self.clicking = True
                         if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])}) # adding self.scroll converts from the display space to the world's space
+                            tile = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])}     # adding self.scroll converts from the display space to the world's space
+                            self.tilemap.add_offgrid(tile)
+                            self.changed.append(pygame.Rect(self.tilemap.offgrid_rect(tile)))
+                            self.saver.record_offgrid_add(tile)
                     if event.button == 3:               # right clicking, 2 is for pressing down on mouse wheel.
                         self.right_clicking = True
+                    if event.button in (1, 3) and self.ongrid:
+                        if self.brush in ('line', 'rect'):
+                            self.brush_start = tile_pos
+                        if self.brush == 'flood':
+                            if event.button == 1:
+                                self.paint(flood_cells(self.tilemap, tile_pos))
+                            else:
+                                self.erase(flood_cells(self.tilemap, tile_pos))
                     if self.shift:                      # hold shift to cycle through variants.
                         if event.button == 4:
                             self.tile_variant = (self.tile_variant - 1) % len(self.assets[self.tile_list[self.tile_group]])       # -1 for scrolling up mod is to loop through
@@ -120,6 +249,13 @@ class Editor:
                             self.tile_group = (self.tile_group + 1) % len(self.tile_list)       # +1 for scrolling down.
                             self.tile_variant = 0                                               # to prevent indexing errors.
                 if event.type == pygame.MOUSEBUTTONUP:                                          # clicking variables will be updated on current mouse state
+                    if event.button in (1, 3) and self.brush_start:         # a line or rectangle goes in all at once when the mouse comes up.
+                        cells = (line_cells if self.brush == 'line' else rect_cells)(self.brush_start, tile_pos)
+                        if event.button == 1:
+                            self.paint(cells)
+                        else:
+                            self.erase(cells)
+                        self.brush_start = None
                     if event.button == 1:
                         self.clicking = False
                     if event.button == 3:
@@ -138,8 +274,13 @@ class Editor:
                         self.ongrid = not self.ongrid
                     if event.key == pygame.K_t:
                         self.tilemap.autotile()
+                        self.saver.record_autotile()
+                        self.view_scroll = None
+                    if event.key in BRUSHES:
+                        self.brush = BRUSHES[event.key]
+                        self.brush_start = None
                     if event.key == pygame.K_o:
-                        self.tilemap.save('02.json')
+                        self.saver.save()           # in the background, the editor keeps going while it's written.
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
                 if event.type == pygame.KEYUP:
@@ -154,12 +295,14 @@ class Editor:
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
 
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))      # scale display and show it, 'blit' it, onto the screen.
-            # For updating the display, without this, will just get a black screen
-            pygame.display.update()
             # Run at 60fps, this function is a dynamic sleep to sleep as long as it
             # needs to maintain 60fps.
             self.clock.tick(60)
 
 
-Editor().run()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='the level editor.')
+    parser.add_argument('--renderer', default='auto', choices=BACKENDS, help='sdl2 scales the frame with SDL\'s renderer, software with pygame.transform.scale, auto tries sdl2 first')
+    parser.add_argument('--scale', default='stretch', choices=SCALE_MODES, help='fill the window, or keep square pixels with a whole number scale or just the frame\'s shape')
+    args = parser.parse_args()
+    Editor(renderer=args.renderer, scale_mode=args.scale).run()
@@ -1,30 +1,66 @@
+import os
 import sys
+import time
 import random
 import math
+import argparse
 
 import pygame
 
-from scripts.utils import load_image, load_images, Animation
 from scripts.entities import PhysicsEntity, Player, Enemy, Matt, Potts
 from scripts.tilemap import Tilemap
-from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.clouds import Clouds, Backdrop
+from scripts.particle import ParticleSystem
+from scripts.spark import SparkSystem
+from scripts.projectile import ProjectilePool
+from scripts.controls import KeyboardInput, ScriptedInput
+from scripts.replay import Recorder, ReplayInput
+from scripts.profiler import FrameProfiler
+from scripts.assets import AssetManager, ASSETS, map_assets, read_map
+from scripts.utils import get_atlas
+from scripts.mapfile import find_map
+from scripts.levelcache import LevelCache, LevelSnapshot
+from scripts.state import GameState
+from scripts.present import make_presenter, SCALE_MODES, BACKENDS
+from scripts.activity import ActivityScheduler
+
+
+TICK_RATE = 60              # simulation steps per second, every physics number in the game is per tick at this rate.
+MAX_FRAME_TIME = 0.25       # longest real frame we try to catch up on, after that the game slows down instead of running hundreds of ticks in a row.
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, level=None, input_source=None, max_fps=144, seed=None, stream_radius=None, renderer='auto', scale_mode='stretch'):
+        self.headless = headless
+        if headless:
+            # SDL's dummy driver gives us a fake display, images still need one to .convert() against but nothing is ever shown.
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
         pygame.init()
 
-        pygame.display.set_caption('ninja game')
-
-        # Create Game Window with resolution, display is to render onto smaller screen, then scale to the larger screen.
-        self.screen = pygame.display.set_mode((1920, 1080))
+        self.presenter = None
+        if headless:
+            pygame.display.set_mode((1, 1))
+        else:
+            # Create Game Window with resolution, display is to render onto smaller screen, then the presenter scales it to the larger window.
+            # see scripts/present.py, by default SDL's renderer does the scaling and it falls back to pygame.transform.scale.
+            self.presenter = make_presenter(renderer, 'ninja game', (1920, 1080), (455, 270), scale_mode)
         self.display = pygame.Surface((455, 270))      # all black by default
-        # Set game clock to run at 60fps, need to do
-        # to prevent overtaxing processor, not using
-        # delta time only using static time.
+        # the simulation always steps at TICK_RATE, no delta time in the physics, so gravity, dash speed etc. feel the same on every machine.
+        # the clock only caps how often we draw, run() works out how many ticks are due from the real time between frames.
         self.clock = pygame.time.Clock()
+        self.max_fps = max_fps
+        self.stream_radius = stream_radius      # chunks around the camera to keep loaded for binary maps, None loads whole maps.
+
+        self.input = input_source if input_source else KeyboardInput()     # where (action, pressed) pairs come from each frame.
+
+        # every random number in the simulation comes from the random module seeded here, so the seed plus the inputs decide the whole run.
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        random.seed(self.seed)
+        self.render_random = random.Random()        # screenshake jitter only, how often we draw must not change the simulation's random numbers.
+        self.frame = 0
+        self.sim_fps = 0
+        self.profiler = FrameProfiler()         # F3 shows the time each phase of a frame takes, F4 writes them to profile_path.
+        self.profile_path = 'profile.csv'
 
         self.movement = [False, False]
 
@@ -32,232 +68,410 @@ class Game:
 
         self.pottsmovement = [False, False]
 
-        self.assets = {
-            'decor': load_images('tiles/decor'),
-            'grass': load_images('tiles/grass'),
-            'large_decor': load_images('tiles/large_decor'),
-            'stone': load_images('tiles/stone'),
-            'castle': load_images('tiles/castle'),
-            'pipe': load_images('tiles/pipe'),
-            'yellowblock': load_images('tiles/yellowblock'),
-            'player': load_image('entities/player.png'),
-            'background': load_image('background.png'),
-            'clouds': load_images('clouds'),
-            'enemy/idle': Animation(load_images('entities/enemy/idle'), img_dur=6),
-            'enemy/run': Animation(load_images('entities/enemy/run'), img_dur=4),
-            'matt/idle': Animation(load_images('entities/matt/idle'), img_dur=6),
-            'matt/walk': Animation(load_images('entities/matt/walk'), img_dur=6),
-            'matt/angry': Animation(load_images('entities/matt/angry'), img_dur=6, loop=False),
-            'matt/jump': Animation(load_images('entities/matt/jump'), img_dur=5, loop=False),
-            'potts/idle': Animation(load_images('entities/potts/idle'), img_dur=5),
-            'potts/walk': Animation(load_images('entities/potts/walk'), img_dur=5),
-            'potts/surprised': Animation(load_images('entities/potts/surprised'), img_dur=5, loop=False),
-            'potts/jump': Animation(load_images('entities/potts/jump'), img_dur=5, loop=False),
-            'potts/milk': Animation(load_images('entities/potts/milk'), img_dur=5, loop=False),
-            'player/idle': Animation(load_images('entities/player/idle'), img_dur=6, isPlayer=True),
-            'player/run': Animation(load_images('entities/player/run'), img_dur=4, isPlayer=True),
-            'player/jump': Animation(load_images('entities/player/jump'), img_dur=5),
-            'player/slide': Animation(load_images('entities/player/slide'), img_dur=5),
-            'player/wall_slide': Animation(load_images('entities/player/wall_slide'), img_dur=5),
-            'particle/leaf': Animation(load_images('particles/leaf'), img_dur=20, loop=False),
-            'particle/particle': Animation(load_images('particles/particle'), img_dur=6, loop=False),
-            'gun': load_image('gun.png'),
-            'projectile': load_image('projectile.png'),
-
-        }
+        # nothing is loaded yet, the map's assets are asked for first and the rest follow in the background, see scripts/assets.py
+        self.assets = AssetManager()
+        self.starting_level = level if level else '02'
+        path = find_map(self.starting_level)
+        self.read_maps = {path: read_map(path)}         # the first map is read once, for its asset list here and for load_level.
+        level_assets = self.level_assets(path, self.read_maps[path])
+        self.assets.request(level_assets)
+        self.assets.request(ASSETS)
+        if not headless:
+            self.loading_screen(level_assets)
 
         self.clouds = Clouds(self.assets['clouds'], count=16)
+        self.backdrop = Backdrop(self.assets['background'], self.clouds)      # background and clouds drawn together, and only when the clouds moved a pixel.
         self.matt = False
         self.potts = False
-        self.starting_level = '02'
 
         self.player = Player(self, (50, 50), (12, 29))
 
         self.tilemap = Tilemap(self, tile_size=16)
+        self.level_cache = LevelCache()
+
+        self.particles = ParticleSystem(self)       # all particles live in one set of arrays, see scripts/particle.py
+        self.sparks = SparkSystem()
+        self.projectiles = ProjectilePool()
+        self.activity = ActivityScheduler()        # which enemies are close enough to the camera to update and draw, see scripts/activity.py
 
         self.load_level(self.starting_level)
 
         self.screenshake = 0
 
-    def load_level(self, map_id):
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
+    def level_assets(self, path, map_data=None):
+        names = map_assets(path, map_data)
+        if self.starting_level == '0' and 'potts/idle' in names:
+            names += ['potts/normalidle', 'potts/normalwalk', 'potts/normalsurprised']
+        return names
+
+    def loading_screen(self, names):
+        """
+        a progress bar while the first level's images load, the window shows up straight away instead of after everything is on disk.
+        """
+        while self.assets.progress(names) < 1:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+            self.display.fill((0, 0, 0))
+            bar = pygame.Rect(self.display.get_width() // 4, self.display.get_height() // 2 - 3, self.display.get_width() // 2, 6)
+            pygame.draw.rect(self.display, (255, 255, 255), bar, 1)
+            pygame.draw.rect(self.display, (255, 255, 255), (bar.x + 2, bar.y + 2, (bar.width - 4) * self.assets.progress(names), bar.height - 4))
+            self.presenter.present(self.display)
+            self.assets.poll(timeout=1 / 60)        # back as soon as anything finishes, the bar moves and nothing waits on the frame rate.
 
-        self.leaf_spawners = []
-        for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
-            self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))      # takes position of the tree and makes it based off of the tree's size.
+    def load_level(self, map_id):
+        """
+        start map_id from the beginning. the first time a map is played it's read from disk and its spawners pulled out,
+        after that it comes back from self.level_cache, so respawning or going back to a level costs next to nothing.
+        """
+        self.level = map_id
+        path = find_map(map_id)
+        snapshot = None if self.stream_radius else self.level_cache.get(path)        # a streamed map is never all in memory to snapshot.
+        if snapshot:
+            self.leaf_spawners, spawners = snapshot.restore(self.tilemap)
+        else:
+            map_data = self.read_maps.pop(path, None) or read_map(path)
+            self.assets.wait(self.level_assets(path, map_data))        # already loaded unless this level uses something nothing has needed yet.
+            self.tilemap.load(path, stream_radius=self.stream_radius, map_data=map_data)        # the binary .map when it's been converted and is up to date, otherwise the json.
+
+            self.leaf_spawners = []
+            for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
+                self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))      # takes position of the tree and makes it based off of the tree's size.
+
+            spawners = self.tilemap.extract([('spawners', 0), ('spawners', 1), ('spawners', 2), ('spawners', 3)])     #we're not using keep, because keep is used to keep the tilemap in the tilemap or to showup on the tilemap, we don't want the spawners to show, we just want the locations.
+            if not self.stream_radius:
+                self.level_cache.put(path, LevelSnapshot(self.tilemap, self.leaf_spawners, spawners))
 
         self.enemies = []
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1), ('spawners', 2), ('spawners', 3)]):     #we're not using keep, because keep is used to keep the tilemap in the tilemap or to showup on the tilemap, we don't want the spawners to show, we just want the locations.
+        for spawner in spawners:
             if spawner['variant'] == 0:
-                self.player.pos = spawner['pos']
+                self.player.place(spawner['pos'])
                 self.player.air_time = 0        # reset air time to not trigger multiple times.
             elif spawner['variant'] == 2:
                 self.matt = Matt(self, (100, 100), (12, 29))
-                self.matt.pos = spawner['pos']
+                self.matt.place(spawner['pos'])
                 self.matt.air_time = 0
             elif spawner['variant'] == 3:
-                if self.starting_level == '0':
-                    self.assets['potts/idle'] = Animation(load_images('entities/potts/normalidle'), img_dur=5)
-                    self.assets['potts/walk'] = Animation(load_images('entities/potts/normalwalk'), img_dur=5)
-                    self.assets['potts/surprised'] = Animation(load_images('entities/potts/normalsurprised'), img_dur=5, loop=False)
+                if self.starting_level == '0':        # level_assets has these ready, no disk in the middle of a level change.
+                    self.assets['potts/idle'] = self.assets['potts/normalidle']
+                    self.assets['potts/walk'] = self.assets['potts/normalwalk']
+                    self.assets['potts/surprised'] = self.assets['potts/normalsurprised']
                 self.potts = Potts(self, (100, 100), (12, 29))
-                self.potts.pos = spawner['pos']
+                self.potts.place(spawner['pos'])
                 self.potts.air_time = 0
             else:
                 self.enemies.append(Enemy(self, spawner['pos'], (8, 12)))
+        self.activity.reset(self.enemies)
 
-        self.projectiles = []
-        self.particles = []
-        self.sparks = []
+        self.projectiles.clear()
+        self.particles.clear()
+        self.sparks.clear()
 
         self.scroll = [0, 0]        # "camera's" location
+        self.prev_scroll = [0, 0]   # camera at the start of the last tick, for blending in render.
         self.dead = 0
 
-    def run(self):
+    def snapshot(self):
+        """
+        the whole simulation as a GameState, restore() puts it back. cheap enough to take every frame,
+        for rolling back and replaying the three characters' inputs, retrying from a checkpoint or going back to a slow frame.
+        """
+        return GameState(
+            frame=self.frame,
+            level=self.level,
+            random_state=random.getstate(),
+            screenshake=self.screenshake,
+            dead=self.dead,
+            scroll=tuple(self.scroll),
+            prev_scroll=tuple(self.prev_scroll),
+            movement=(tuple(self.movement), tuple(self.mattmovement), tuple(self.pottsmovement)),
+            player=self.player.snapshot(),
+            enemies=[enemy.snapshot() for enemy in self.enemies],
+            matt=self.matt.snapshot() if self.matt else None,
+            potts=self.potts.snapshot() if self.potts else None,
+            particles=self.particles.snapshot(),
+            sparks=self.sparks.snapshot(),
+            projectiles=self.projectiles.snapshot(),
+            clouds=self.clouds.snapshot(),
+        )
+
+    def restore(self, state):
+        if state.level != self.level:
+            self.load_level(state.level)        # from the level cache, the tiles never change while playing so only which map it is matters.
+        random.setstate(state.random_state)
+        self.frame = state.frame
+        self.screenshake = state.screenshake
+        self.dead = state.dead
+        self.scroll = list(state.scroll)
+        self.prev_scroll = list(state.prev_scroll)
+        self.movement, self.mattmovement, self.pottsmovement = [list(held) for held in state.movement]
+        self.player.restore(state.player)
+        # enemies that died since get made again, their state overwrites everything the constructor set.
+        self.enemies = self.enemies[:len(state.enemies)] + [Enemy(self, (0, 0), (8, 12)) for i in range(len(state.enemies) - len(self.enemies))]
+        for enemy, enemy_state in zip(self.enemies, state.enemies):
+            enemy.restore(enemy_state)
+        self.activity.reset(self.enemies)
+        if state.matt:
+            self.matt = self.matt or Matt(self, (0, 0), (12, 29))
+            self.matt.restore(state.matt)
+        else:
+            self.matt = False
+        if state.potts:
+            self.potts = self.potts or Potts(self, (0, 0), (12, 29))
+            self.potts.restore(state.potts)
+        else:
+            self.potts = False
+        self.particles.restore(state.particles)
+        self.sparks.restore(state.sparks)
+        self.projectiles.restore(state.projectiles)
+        self.clouds.restore(state.clouds)
+        if isinstance(self.input, Recorder):
+            self.input.rewind(state.frame)
+
+    def apply_input(self, action, pressed):
+        """
+        one (action, pressed) pair from the keyboard, a script or a replay, see scripts/controls.py for the key bindings.
+        """
+        if action == 'quit':
+            pygame.quit()
+            sys.exit()                          # exit application.
+        if action == 'profiler' and pressed:
+            self.profiler.toggle()
+        if action == 'profiler_dump' and pressed:
+            self.profiler.dump_csv(self.profile_path)
+        if action == 'left':
+            self.movement[0] = pressed
+        if action == 'right':
+            self.movement[1] = pressed
+        if action == 'jump' and pressed:
+            self.player.jump()       # overrides vertical velocity to move player upwards, gravity will move them downwards again.
+        if action == 'dash' and pressed:
+            self.player.dash()
+        if action == 'matt_left':
+            self.mattmovement[0] = pressed
+        if action == 'matt_right':
+            self.mattmovement[1] = pressed
+        if self.matt:           # matt and potts only exist on levels with their spawners.
+            if action == 'matt_jump' and pressed:
+                self.matt.jump()
+            if action == 'matt_angry':
+                self.matt.angry = pressed
+        if action == 'potts_left':
+            self.pottsmovement[0] = pressed
+        if action == 'potts_right':
+            self.pottsmovement[1] = pressed
+        if self.potts:
+            if action == 'potts_jump' and pressed:
+                self.potts.jump()
+            if action == 'potts_milk':
+                self.potts.milk = pressed
+            if action == 'potts_surprised':
+                self.potts.surprised = pressed
+
+    def update(self):
+        """
+        one frame of the simulation, nothing in here draws, so it runs the same with or without a window.
+        """
+        profiler = self.profiler
+        for action, pressed in self.input.poll(self.frame):
+            self.apply_input(action, pressed)
+        profiler.mark('events')
+
+        self.screenshake = max(0, self.screenshake - 1)     # timer that goes down to zero.
+
+        if self.dead:
+            self.dead += 1
+            if self.dead > 40:  # once dead, wait 40 frames, timer is above with the += 1
+                self.load_level(1)
+
+        self.prev_scroll[0], self.prev_scroll[1] = self.scroll[0], self.scroll[1]
+        # camera position is changed based on the player's center of rect, technically camera position is in top left of screen so to center player, we need to remove half of the screen. We also subtract our current position, and add to the scroll.
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30 # dividing the increment by 30, it now takes 1/30 of the distance to center and applies that so the result is the further away the player is the faster the camera moves since we're using a ratio.
+        self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
+        self.tilemap.stream_update(self.scroll, self.display.get_size())
+
+        for rect in self.leaf_spawners:
+            if random.random() * 49999 < rect.width * rect.height:          # the 49999 is to control the rate of the spawn, it will make it so we're not spawning every frame. This is a random odd chance line of code, make sure its smaller than the hitbox
+                pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)       # pos is spawn position of leaf, gives us any number within the bounds of the rect.
+                self.particles.spawn('leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20))
+
+        profiler.mark('camera')
+
+        self.clouds.update()
+        profiler.mark('clouds')
+
+        # ENEMIES SECTION
+
+        # only the enemies around the camera, far away ones tick now and then or sleep. see scripts/activity.py
+        for enemy in self.activity.due(self.scroll, self.display.get_size(), self.frame):
+            kill = enemy.update(self.tilemap, (0, 0))
+            if kill:
+                self.enemies.remove(enemy)
+                self.activity.remove(enemy)
+            else:
+                self.activity.moved(enemy)
+        profiler.mark('enemies')
+
+        if self.matt:
+            self.matt.update(self.tilemap, (self.mattmovement[1] - self.mattmovement[0], 0)) ############################
+
+        if self.potts:
+            self.potts.update(self.tilemap, (self.pottsmovement[1] - self.pottsmovement[0], 0)) ############################
+
+        if not self.dead:
+            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0)) ############################
+        profiler.mark('characters')
+
+        # every projectile moves, then checks walls, its lifetime and the player, all in batches. see scripts/projectile.py
+        self.projectiles.update()
+        for hit_pos, velocity in self.projectiles.wall_hits(self.tilemap):
+            for i in range(4):
+                self.sparks.spawn(hit_pos, random.random() - 0.5 + (math.pi if velocity[0] > 0 else 0), 2 + random.random())
+        self.projectiles.expire()
+        if abs(self.player.dashing) < 50:     # if you're not in the moving fast part of the dash animation, dashing is invincible
+            for hit_pos in self.projectiles.hit_rect(self.player.rect()):  # if player hit by projectile.
+                self.dead += 1
+                self.screenshake = max(16, self.screenshake)
+                spark_angles, spark_speeds = [], []
+                for i in range(30):     # spawning 30 sparks
+                    angle = random.random() * math.pi * 2
+                    speed = random.random() * 5
+                    spark_angles.append(angle)
+                    spark_speeds.append(2 + random.random())
+                    self.particles.spawn('particle', self.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7))
+                self.sparks.spawn_many(self.player.rect().center, spark_angles, spark_speeds)
+        profiler.mark('projectiles')
+
+        # one vectorized step for every particle, including the leaf sway, finished ones are dropped on the next update.
+        self.sparks.update()
+        profiler.mark('sparks')
+        self.particles.update()
+        profiler.mark('particles')
+
+        self.frame += 1
+
+    def render(self, alpha=1.0):
+        """
+        draw the world alpha of the way from the previous tick to the current one (0 to 1), run() passes how far into the next tick real time has got.
+        """
+        profiler = self.profiler
+        scroll = (self.prev_scroll[0] + (self.scroll[0] - self.prev_scroll[0]) * alpha, self.prev_scroll[1] + (self.scroll[1] - self.prev_scroll[1]) * alpha)
+        render_scroll = (int(scroll[0]), int(scroll[1]))      # this is to remove 1 pixel jitter in player entity because of sub pixel calculations for camera offset since it is a float.
+        # camera will still move closer to target in pixels not sub-pixels so it will jitter when moving close to character, but the character itself won't.
+
+        self.backdrop.render(self.display, offset=render_scroll)     # draw screen to prevent trails of moving images, the clouds are part of it.
+        profiler.mark('draw background')
+
+        self.tilemap.render(self.display, offset=render_scroll)
+        profiler.mark('draw tilemap')
+
+        for enemy in self.activity.visible(render_scroll, self.display.get_size()):
+            enemy.render(self.display, offset=render_scroll, alpha=alpha)
+        profiler.mark('draw enemies')
+
+        if self.matt:
+            self.matt.render(self.display, offset=render_scroll, alpha=alpha)
+
+        if self.potts:
+            self.potts.render(self.display, offset=render_scroll, alpha=alpha)
+
+        if not self.dead:
+            self.player.render(self.display, offset=render_scroll, alpha=alpha)
+        profiler.mark('draw characters')
+
+        self.projectiles.render(self.display, self.assets['projectile'], offset=render_scroll, alpha=alpha)
+        profiler.mark('draw projectiles')
+        self.sparks.render(self.display, offset=render_scroll)
+        profiler.mark('draw sparks')
+        self.particles.render(self.display, offset=render_scroll)
+        profiler.mark('draw particles')
+
+        profiler.render(self.display)       # F3, the per phase timings, drawn last so it's on top of everything.
+        profiler.mark('draw profiler')
+
+        screenshake_offset = (self.render_random.random() * self.screenshake - self.screenshake / 2, self.render_random.random() * self.screenshake - self.screenshake / 2)
+        self.presenter.present(self.display, offset=screenshake_offset)      # scale display and show it on the window.
+        profiler.mark('present')
+
+    def step(self, n=1):
+        """
+        run n frames of simulation as fast as possible, no drawing and no frame cap.
+        returns how many simulated frames per second that was, also kept in self.sim_fps.
+        """
+        start = time.perf_counter()
+        for i in range(n):
+            self.profiler.begin_frame()
+            self.update()
+            self.profiler.end_frame()
+        elapsed = time.perf_counter() - start
+        self.sim_fps = n / elapsed if elapsed else float('inf')
+        return self.sim_fps
 
+    def run(self):
+        """
+        fixed timestep loop: real time piles up in the accumulator and is spent in whole TICK_RATE ticks,
+        whatever is left over says how far to blend between the last two ticks when drawing.
+        a slow frame runs a few ticks to catch up instead of slowing the game down, a fast screen just draws in between ticks.
+        """
+        accumulator = 0
+        tick = 1 / TICK_RATE
+        self.clock.tick()
         while True:
-            self.display.blit(self.assets['background'], (0, 0))        # draw screen to prevent trails of moving images.
-
-            self.screenshake = max(0, self.screenshake - 1)     # timer that goes down to zero.
-
-            if self.dead:
-                self.dead += 1
-                if self.dead > 40:  # once dead, wait 40 frames, timer is above with the += 1
-                    self.load_level(1)
-
-            # camera position is changed based on the player's center of rect, technically camera position is in top left of screen so to center player, we need to remove half of the screen. We also subtract our current position, and add to the scroll.
-            self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30 # dividing the increment by 30, it now takes 1/30 of the distance to center and applies that so the result is the further away the player is the faster the camera moves since we're using a ratio.
-            self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))      # this is to remove 1 pixel jitter in player entity because of sub pixel calculations for camera offset since it is a float.
-            # camera will still move closer to target in pixels not sub-pixels so it will jitter when moving close to character, but the character itself won't.
-
-            for rect in self.leaf_spawners:
-                if random.random() * 49999 < rect.width * rect.height:          # the 49999 is to control the rate of the spawn, it will make it so we're not spawning every frame. This is a random odd chance line of code, make sure its smaller than the hitbox
-                    pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)       # pos is spawn position of leaf, gives us any number within the bounds of the rect.
-                    self.particles.append(Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
-
-            self.clouds.update()
-            self.clouds.render(self.display, offset=render_scroll)
-
-            self.tilemap.render(self.display, offset=render_scroll)
-
-            # ENEMIES SECTION
-
-            for enemy in self.enemies.copy():
-                kill = enemy.update(self.tilemap, (0, 0))
-                enemy.render(self.display, offset=render_scroll)
-                if kill:
-                    self.enemies.remove(enemy)
-
-            if self.matt:
-                self.matt.update(self.tilemap, (self.mattmovement[1] - self.mattmovement[0], 0)) ############################
-                self.matt.render(self.display, offset=render_scroll)
-
-            if self.potts:
-                self.potts.update(self.tilemap, (self.pottsmovement[1] - self.pottsmovement[0], 0)) ############################
-                self.potts.render(self.display, offset=render_scroll)
-
-            if not self.dead:
-                self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0)) ############################
-                self.player.render(self.display, offset=render_scroll)
-
-            # [[x, y], direction, timer]
-            for projectile in self.projectiles.copy():      # copy cause we're removing them later
-                projectile[0][0] += projectile[1]
-                projectile[2] += 1  # timer
-                img = self.assets['projectile']         # often times when adding something new, if you can't see it, its often because you got the camera stuff wrong, like offsets, think about how the camera should apply to whatever you are working on.
-                self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0], projectile[0][1] - img.get_height() / 2 - render_scroll[1]))    # subtracting half the width gets center
-                if self.tilemap.solid_check(projectile[0]):
-                    self.projectiles.remove(projectile)
-                    for i in range(4):
-                        self.sparks.append(Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0), 2 + random.random()))
-                elif projectile[2] > 360:
-                    self.projectiles.remove(projectile)
-                elif abs(self.player.dashing) < 50:     # if you're not in the moving fast part of the dash animation, dashing is invincible
-                    if self.player.rect().collidepoint(projectile[0]):  # if player hit by projectile.
-                        self.projectiles.remove(projectile)
-                        self.dead += 1
-                        self.screenshake = max(16, self.screenshake)
-                        for i in range(30):     # spawning 30 sparks
-                            angle = random.random() * math.pi * 2
-                            speed = random.random() * 5
-                            self.sparks.append(Spark(self.player.rect().center, angle, 2 + random.random()))
-                            self.particles.append(Particle(self, 'particle', self.player.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
-
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.display, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-
-            for particle in self.particles.copy():
-                kill = particle.update()
-                particle.render(self.display, offset=render_scroll)
-                if particle.type == 'leaf':
-                    particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3         # helps particle move back and forth in a smooth pattern, the 0.035 is to make sure you don't go through the loop of the sin function too fast. It always gives a number between -1 and 1.
-                if kill:
-                    self.particles.remove(particle)
-
-            # prevent computer from thinking program is not responding by constantly querying pygame.event
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:           # pygame.QUIT is clicking X in the window.
-                    pygame.quit()
-                    sys.exit()                          # exit application.
-
-                if event.type == pygame.KEYDOWN:        # pygame.KEYDOWN is for any key being pressed.
-                    if event.key == pygame.K_LEFT:
-                        self.mattmovement[0] = True
-                    if event.key == pygame.K_RIGHT:
-                        self.mattmovement[1] = True
-                    if event.key == pygame.K_UP:
-                        self.matt.jump()
-                    if event.key == pygame.K_DOWN:
-                        self.matt.angry = True
-                    if event.key == pygame.K_j:
-                        self.pottsmovement[0] = True
-                    if event.key == pygame.K_l:
-                        self.pottsmovement[1] = True
-                    if event.key == pygame.K_i:
-                        self.potts.jump()
-                    if event.key == pygame.K_m:
-                        self.potts.milk = True
-                    if event.key == pygame.K_k:
-                        self.potts.surprised = True
-                    if event.key == pygame.K_a:         # for the up arrow and 'w' key
-                        self.movement[0] = True
-                    if event.key == pygame.K_d:
-                        self.movement[1] = True
-                    if event.key == pygame.K_SPACE:
-                        self.player.jump()       # overrides vertical velocity to move player upwards, gravity will move them downwards again.
-                    if event.key == pygame.K_x:
-                        self.player.dash()
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_LEFT:
-                        self.mattmovement[0] = False
-                    if event.key == pygame.K_RIGHT:
-                        self.mattmovement[1] = False
-                    if event.key == pygame.K_DOWN:
-                        self.matt.angry = False
-                    if event.key == pygame.K_j:
-                        self.pottsmovement[0] = False
-                    if event.key == pygame.K_l:
-                        self.pottsmovement[1] = False
-                    if event.key == pygame.K_m:
-                        self.potts.milk = False
-                    if event.key == pygame.K_k:
-                        self.potts.surprised = False
-                    if event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_d:
-                        self.movement[1] = False
-
-            screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2, random.random() * self.screenshake - self.screenshake / 2)
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), screenshake_offset)      # scale display and show it, 'blit' it, onto the screen.
-            # For updating the display, without this, will just get a black screen
-            pygame.display.update()
-            # Run at 60fps, this function is a dynamic sleep to sleep as long as it
-            # needs to maintain 60fps.
-            self.clock.tick(60)
-
-
-Game().run()
+            # tick is a dynamic sleep to hold us at max_fps, and returns milliseconds since the last call. 0 means no cap.
+            accumulator += min(self.clock.tick(self.max_fps) / 1000, MAX_FRAME_TIME)
+            self.profiler.begin_frame()         # after the tick, time spent sleeping to hold the frame cap isn't a phase.
+            while accumulator >= tick:
+                self.update()
+                accumulator -= tick
+            self.render(alpha=accumulator / tick)
+            self.profiler.end_frame()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run the game, or with --headless just the simulation with no window.')
+    parser.add_argument('--level', default=None, help='map name in data/maps to start on')
+    parser.add_argument('--headless', action='store_true', help='no display, no frame cap, print simulated frames per second')
+    parser.add_argument('--frames', type=int, default=None, help='how many frames to simulate with --headless, default 3600 or the whole replay')
+    parser.add_argument('--script', default=None, help='json input script, a list of [frame, action, pressed]')
+    parser.add_argument('--fps', type=int, default=144, help='cap on how often to draw, 0 for no cap, the simulation always ticks at 60')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, the same seed and inputs always play out the same')
+    parser.add_argument('--record', default=None, help='save this run\'s inputs and seed to a replay file when the game closes')
+    parser.add_argument('--replay', default=None, help='play back a replay file, uses its level and seed')
+    parser.add_argument('--stream', type=int, default=None, help='only keep the map chunks within this many chunks of the camera loaded, for converted .map levels')
+    parser.add_argument('--renderer', default='auto', choices=BACKENDS, help='sdl2 scales the frame with SDL\'s renderer, software with pygame.transform.scale, auto tries sdl2 first')
+    parser.add_argument('--scale', default='stretch', choices=SCALE_MODES, help='fill the window, or keep square pixels with a whole number scale or just the frame\'s shape')
+    parser.add_argument('--profile', default=None, help='time every phase of every frame from the start and write them to this csv file on exit')
+    args = parser.parse_args()
+
+    level, seed, source = args.level, args.seed, None
+    if args.script:
+        source = ScriptedInput.load(args.script)
+    if args.replay:
+        source = ReplayInput.load(args.replay)
+        level, seed = source.level, source.seed
+    game = Game(headless=args.headless, level=level, input_source=source, max_fps=args.fps, seed=seed, stream_radius=args.stream, renderer=args.renderer, scale_mode=args.scale)
+    if args.profile:
+        game.profiler.toggle()
+        game.profile_path = args.profile
+        if not get_atlas():         # startup time is part of what's being measured.
+            print('no up to date image cache, the pngs were loaded one by one. python -m scripts.atlas builds one for a faster start')
+    recorder = None
+    if args.record:
+        recorder = game.input = Recorder(game.input, game.seed, game.starting_level, args.record)
+
+    try:
+        if args.headless:
+            frames = args.frames if args.frames else (len(source) if args.replay else 3600)
+            fps = game.step(frames)
+            print(f'{frames} frames on level {game.starting_level}: {fps:.1f} simulated frames per second')
+            if args.profile:
+                for name, average, p99 in game.profiler.stats():
+                    print(f'  {name:<12} avg {average:.3f} ms  p99 {p99:.3f} ms')
+        else:
+            game.run()
+    finally:
+        if recorder:        # closing the window exits through sys.exit, this still runs.
+            recorder.save()
+        if args.profile:
+            game.profiler.dump_csv(args.profile)
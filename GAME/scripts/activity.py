@@ -0,0 +1,67 @@
+from scripts.spatial import SpatialGrid
+
+ACTIVE_MARGIN = 64          # pixels past the edge of the screen where enemies still get every tick, so nothing walks on screen frozen.
+NEAR_MARGIN = 320           # past that and up to here enemies get one tick in NEAR_EVERY, so they run at a quarter speed while the camera comes closer.
+NEAR_EVERY = 4
+VIEW_MARGIN = 16            # sprites hang a little over their rects, this much past the screen is still drawn.
+
+
+class ActivityScheduler:
+    """
+    decides which enemies get updated and drawn, so a frame costs what's around the camera and not how many
+    enemies the level has. enemies are filed in a SpatialGrid by rect:
+        near the screen     updated every tick like before.
+        further out         updated every NEAR_EVERY ticks, spread over the ticks by where they stand.
+        everywhere else     asleep, nothing looks at them until the camera comes back.
+    the ones further out run slow on purpose: an update is one ordinary tick, so they walk, fall and count down their
+    walking timer at 1 / NEAR_EVERY of the normal speed. catching up by scaling one tick up would let a falling enemy
+    move further than a tile in one step and go through the floor, and running the skipped ticks costs what not
+    skipping them does. where an enemy is by the time it's on screen depends on how long it spent out there, which
+    is fine for enemies that mostly pace about and nobody was watching.
+    it only ever looks at the grid cells around the camera. what's due depends on the camera, the frame and
+    the enemies' positions, all of which are in a GameState, so restoring one and replaying gives the same game.
+    """
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.grid = SpatialGrid(cell_size)
+
+    def reset(self, entities):
+        """
+        file entities again from scratch, in list order, which is the order they update and draw in.
+        """
+        self.grid.clear()
+        for entity in entities:
+            self.grid.insert(entity, entity.rect())
+
+    def add(self, entity):
+        self.grid.insert(entity, entity.rect())
+
+    def remove(self, entity):
+        self.grid.remove(entity)
+
+    def moved(self, entity):
+        self.grid.move(entity, entity.rect())
+
+    def due(self, scroll, view_size, frame):
+        """
+        the entities to update this tick, in the order they were added.
+        """
+        active = (scroll[0] - ACTIVE_MARGIN, scroll[1] - ACTIVE_MARGIN, view_size[0] + ACTIVE_MARGIN * 2, view_size[1] + ACTIVE_MARGIN * 2)
+        right, bottom = active[0] + active[2], active[1] + active[3]
+        due = []
+        for entity in self.grid.query((scroll[0] - NEAR_MARGIN, scroll[1] - NEAR_MARGIN, view_size[0] + NEAR_MARGIN * 2, view_size[1] + NEAR_MARGIN * 2)):
+            rect = self.grid.entries[id(entity)][2]
+            if rect[0] < right and rect[0] + rect[2] > active[0] and rect[1] < bottom and rect[1] + rect[3] > active[1]:
+                due.append(entity)
+            elif not (frame + int(rect[0] // self.cell_size)) % NEAR_EVERY:       # neighbouring cells take turns, so it isn't every far enemy on the same tick.
+                due.append(entity)
+        return due
+
+    def visible(self, scroll, view_size):
+        """
+        the entities on screen, in the order they were added.
+        """
+        return self.grid.query((scroll[0] - VIEW_MARGIN, scroll[1] - VIEW_MARGIN, view_size[0] + VIEW_MARGIN * 2, view_size[1] + VIEW_MARGIN * 2))
+
+    def __len__(self):
+        return len(self.grid)
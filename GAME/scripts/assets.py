@@ -0,0 +1,202 @@
+import os
+import json
+from collections.abc import MutableMapping
+from concurrent import futures
+
+import pygame
+
+from scripts.mapfile import MapFile
+from scripts.utils import BASE_IMG_PATH, get_atlas, load_image, load_images, Animation
+
+# every asset the game can use: name -> (path under data/images, what it is, Animation settings).
+# 'image' is one picture, 'images' a folder of them in name order, 'animation' a folder played as an Animation.
+ASSETS = {
+    'decor': ('tiles/decor', 'images', None),
+    'grass': ('tiles/grass', 'images', None),
+    'large_decor': ('tiles/large_decor', 'images', None),
+    'stone': ('tiles/stone', 'images', None),
+    'castle': ('tiles/castle', 'images', None),
+    'pipe': ('tiles/pipe', 'images', None),
+    'yellowblock': ('tiles/yellowblock', 'images', None),
+    'player': ('entities/player.png', 'image', None),
+    'background': ('background.png', 'image', None),
+    'clouds': ('clouds', 'images', None),
+    'enemy/idle': ('entities/enemy/idle', 'animation', {'img_dur': 6}),
+    'enemy/run': ('entities/enemy/run', 'animation', {'img_dur': 4}),
+    'matt/idle': ('entities/matt/idle', 'animation', {'img_dur': 6}),
+    'matt/walk': ('entities/matt/walk', 'animation', {'img_dur': 6}),
+    'matt/angry': ('entities/matt/angry', 'animation', {'img_dur': 6, 'loop': False}),
+    'matt/jump': ('entities/matt/jump', 'animation', {'img_dur': 5, 'loop': False}),
+    'potts/idle': ('entities/potts/idle', 'animation', {'img_dur': 5}),
+    'potts/walk': ('entities/potts/walk', 'animation', {'img_dur': 5}),
+    'potts/surprised': ('entities/potts/surprised', 'animation', {'img_dur': 5, 'loop': False}),
+    'potts/jump': ('entities/potts/jump', 'animation', {'img_dur': 5, 'loop': False}),
+    'potts/milk': ('entities/potts/milk', 'animation', {'img_dur': 5, 'loop': False}),
+    'potts/normalidle': ('entities/potts/normalidle', 'animation', {'img_dur': 5}),
+    'potts/normalwalk': ('entities/potts/normalwalk', 'animation', {'img_dur': 5}),
+    'potts/normalsurprised': ('entities/potts/normalsurprised', 'animation', {'img_dur': 5, 'loop': False}),
+    'player/idle': ('entities/player/idle', 'animation', {'img_dur': 6, 'isPlayer': True}),
+    'player/run': ('entities/player/run', 'animation', {'img_dur': 4, 'isPlayer': True}),
+    'player/jump': ('entities/player/jump', 'animation', {'img_dur': 5}),
+    'player/slide': ('entities/player/slide', 'animation', {'img_dur': 5}),
+    'player/wall_slide': ('entities/player/wall_slide', 'animation', {'img_dur': 5}),
+    'particle/leaf': ('particles/leaf', 'animation', {'img_dur': 20, 'loop': False}),
+    'particle/particle': ('particles/particle', 'animation', {'img_dur': 6, 'loop': False}),
+    'gun': ('gun.png', 'image', None),
+    'projectile': ('projectile.png', 'image', None),
+}
+
+# what every level needs, the player is always there and anything can die in a burst of particles.
+COMMON_ASSETS = ['background', 'clouds', 'player', 'player/idle', 'player/run', 'player/jump', 'player/slide', 'player/wall_slide', 'particle/particle']
+# what each spawner variant brings into the level with it.
+SPAWNER_ASSETS = {
+    1: ['enemy/idle', 'enemy/run', 'gun', 'projectile'],
+    2: ['matt/idle', 'matt/walk', 'matt/angry', 'matt/jump'],
+    3: ['potts/idle', 'potts/walk', 'potts/surprised', 'potts/jump', 'potts/milk'],
+}
+
+
+def read_map(path):
+    """
+    a json map parsed, so map_assets and Tilemap.load can share it instead of both reading the file. None for a .map,
+    those are read a chunk at a time.
+    """
+    if path.endswith('.map'):
+        return None
+    f = open(path, 'r')
+    map_data = json.load(f)
+    f.close()
+    return map_data
+
+
+def map_assets(path, map_data=None):
+    """
+    the names of the assets a map uses: its tile types, what its spawners bring in and the common ones.
+    map_data is the json from read_map when the map has already been read.
+    """
+    if path.endswith('.map'):
+        map_file = MapFile(path)
+        used = map_file.used()
+        map_file.close()
+    else:
+        if map_data is None:
+            map_data = read_map(path)
+        used = {(tile['type'], tile['variant']) for tile in list(map_data['tilemap'].values()) + map_data['offgrid']}
+    names = list(COMMON_ASSETS)
+    for tile_type, variant in sorted(used):
+        if tile_type == 'spawners':
+            names += SPAWNER_ASSETS.get(variant, [])
+        elif tile_type in ASSETS:
+            names.append(tile_type)
+        if tile_type == 'large_decor' and variant == 2:      # trees drop leaves.
+            names.append('particle/leaf')
+    return list(dict.fromkeys(names))
+
+
+def decode(path, kind):
+    """
+    runs on a worker thread: reads and decompresses the pngs, which is the slow part. nothing here touches the display.
+    """
+    if kind == 'image':
+        return [pygame.image.load(BASE_IMG_PATH + path)]
+    return [pygame.image.load(BASE_IMG_PATH + path + '/' + name) for name in sorted(os.listdir(BASE_IMG_PATH + path))]
+
+
+class AssetManager(MutableMapping):
+    """
+    game.assets. looks like the old dict, but nothing is loaded until it's asked for: request() starts
+    decoding on a pool of worker threads and game.assets[name] waits for that asset only if it isn't done yet.
+    with an up to date image cache (scripts/atlas.py) there's nothing to decode and everything is ready straight away.
+    """
+    def __init__(self, specs=ASSETS, workers=4):
+        self.specs = specs
+        self.loaded = {}
+        self.pending = {}           # name -> future of its decoded surfaces.
+        self.atlas = get_atlas()
+        self.pool = futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='assets') if not self.atlas else None
+
+    def request(self, names):
+        """
+        start loading names in the background, in the order given. asking twice for something is free.
+        """
+        for name in names:
+            if name in self.loaded or name in self.pending:
+                continue
+            if self.pool:
+                self.pending[name] = self.pool.submit(decode, self.specs[name][0], self.specs[name][1])
+            else:
+                self.finish(name)
+
+    def finish(self, name):
+        """
+        turn decoded pngs into the finished asset. on the main thread: .convert() needs the display.
+        """
+        path, kind, settings = self.specs[name]
+        if name in self.pending:
+            images = []
+            for img in self.pending.pop(name).result():         # blocks here if the worker isn't done with it.
+                img = img.convert()
+                img.set_colorkey((0, 0, 0))
+                images.append(img)
+        else:
+            images = [load_image(path)] if kind == 'image' else load_images(path)
+        if kind == 'image':
+            self.loaded[name] = images[0]
+        elif kind == 'animation':
+            self.loaded[name] = Animation(images, **settings)
+        else:
+            self.loaded[name] = images
+
+    def poll(self, timeout=0):
+        """
+        finish whatever the workers are done with, returns how many are still going.
+        with a timeout, first waits up to that many seconds for something to finish.
+        """
+        if timeout and self.pending:
+            futures.wait(list(self.pending.values()), timeout=timeout, return_when=futures.FIRST_COMPLETED)
+        for name in [name for name, future in self.pending.items() if future.done()]:
+            self.finish(name)
+        return len(self.pending)
+
+    def progress(self, names):
+        """
+        fraction of names that are loaded, 1 when they all are.
+        """
+        self.poll()
+        return sum(1 for name in names if name in self.loaded) / len(names) if names else 1
+
+    def wait(self, names):
+        self.request(names)
+        for name in names:
+            if name not in self.loaded:
+                self.finish(name)
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            if name not in self.specs:
+                raise KeyError(name)
+            self.request([name])
+            self.finish(name)       # first use of something nobody asked for ahead of time, this is the only place that waits.
+        return self.loaded[name]
+
+    def __setitem__(self, name, value):
+        self.loaded[name] = value
+
+    def __delitem__(self, name):
+        del self.loaded[name]
+
+    def __contains__(self, name):
+        return name in self.loaded or name in self.specs
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def __iter__(self):
+        return iter(dict.fromkeys(list(self.specs) + list(self.loaded)))
+
+    def __len__(self):
+        return len(set(self.specs) | set(self.loaded))
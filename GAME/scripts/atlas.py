@@ -0,0 +1,147 @@
+"""
+packs every png under data/images into a few big sheets of raw pixels, so startup maps them in
+instead of decoding hundreds of little pngs, and every image in the game is a subsurface of a sheet.
+
+    python -m scripts.atlas         build (or rebuild) data/cache from data/images
+
+the index remembers the modified time of every png it was built from. if anything under data/images
+has changed, been added or removed since, the cache is ignored and the loose pngs are loaded like before.
+"""
+import os
+import json
+import mmap
+
+import pygame
+
+IMG_PATH = 'data/images/'
+CACHE_PATH = 'data/cache/'
+INDEX_FILE = 'atlas.json'
+SHEET_WIDTH = 1024          # sheets are this wide (or as wide as the widest image) and up to this tall.
+SHEET_HEIGHT = 1024
+PADDING = 1                 # black gap between images, black is see through anyway.
+VERSION = 1
+
+
+def source_mtimes(img_path=IMG_PATH):
+    """
+    {path relative to img_path: modified time in nanoseconds} for every png, what the cache is keyed on.
+    """
+    mtimes = {}
+    for folder, dirs, files in os.walk(img_path):
+        for name in files:
+            if name.endswith('.png'):
+                path = os.path.join(folder, name)
+                mtimes[os.path.relpath(path, img_path).replace(os.sep, '/')] = os.stat(path).st_mtime_ns
+    return mtimes
+
+
+def pack(sizes, sheet_width=SHEET_WIDTH, sheet_height=SHEET_HEIGHT):
+    """
+    shelf packing: tallest images first, left to right along a shelf, a new shelf when the row is full
+    and a new sheet when the shelves are. sizes is {name: (w, h)}.
+    returns ({name: (sheet, x, y)}, [(sheet w, sheet h)]).
+    """
+    sheet_width = max([sheet_width] + [w + PADDING for w, h in sizes.values()])
+    places = {}
+    sheets = []
+    x = y = shelf = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+        w, h = sizes[name]
+        if x + w > sheet_width:                 # row's full, start the next shelf under the tallest thing on this one.
+            x, y, shelf = 0, y + shelf, 0
+        if not sheets or (y + h > sheet_height and y):     # out of room, start a new sheet. an image taller than a sheet gets one to itself.
+            sheets.append([0, 0])
+            x = y = shelf = 0
+        places[name] = (len(sheets) - 1, x, y)
+        sheets[-1][0] = max(sheets[-1][0], x + w)
+        sheets[-1][1] = max(sheets[-1][1], y + h)
+        x += w + PADDING
+        shelf = max(shelf, h + PADDING)
+    return places, [tuple(size) for size in sheets]
+
+
+def build(img_path=IMG_PATH, cache_path=CACHE_PATH):
+    """
+    decode every png once and write the sheets as raw RGB bytes plus a json index. returns the index.
+    needs a display mode set, the images go through .convert() exactly like load_image so the pixels match.
+    """
+    mtimes = source_mtimes(img_path)
+    images = {name: pygame.image.load(img_path + name).convert() for name in sorted(mtimes)}
+    places, sheet_sizes = pack({name: img.get_size() for name, img in images.items()})
+
+    sheets = [pygame.Surface(size) for size in sheet_sizes]         # black, which is the colorkey.
+    index = {'version': VERSION, 'sources': mtimes, 'sheets': [], 'images': {}}
+    for name, (sheet, x, y) in places.items():
+        img = images[name]
+        sheets[sheet].blit(img, (x, y))
+        index['images'][name] = [sheet, x, y, img.get_width(), img.get_height()]
+
+    os.makedirs(cache_path, exist_ok=True)
+    for i, sheet in enumerate(sheets):
+        f = open(cache_path + 'atlas' + str(i) + '.raw', 'wb')
+        f.write(pygame.image.tobytes(sheet, 'RGB'))
+        f.close()
+        index['sheets'].append(['atlas' + str(i) + '.raw', sheet.get_width(), sheet.get_height()])
+    f = open(cache_path + INDEX_FILE, 'w')
+    json.dump(index, f)
+    f.close()
+    return index
+
+
+class Atlas:
+    """
+    the loaded cache. image(path) hands out subsurfaces of the sheets, folder(path) the sorted names
+    in a folder so load_images doesn't need to list the directory.
+    """
+    def __init__(self, index, sheets):
+        self.sheets = sheets
+        self.images = {}
+        self.folders = {}
+        for name, (sheet, x, y, w, h) in index['images'].items():
+            self.images[name] = sheets[sheet].subsurface((x, y, w, h))      # subsurfaces keep the sheet's colorkey.
+            folder, file = name.rsplit('/', 1) if '/' in name else ('', name)
+            self.folders.setdefault(folder, []).append(file)
+        for files in self.folders.values():
+            files.sort()
+
+    @classmethod
+    def load(cls, img_path=IMG_PATH, cache_path=CACHE_PATH):
+        """
+        the atlas, or None if there's no cache or it doesn't match the pngs on disk any more.
+        needs a display mode set first, the sheets are .convert()ed like load_image does.
+        """
+        try:
+            f = open(cache_path + INDEX_FILE, 'r')
+            index = json.load(f)
+            f.close()
+        except (OSError, ValueError):
+            return None
+        if index.get('version') != VERSION or index['sources'] != source_mtimes(img_path):
+            return None
+
+        sheets = []
+        for file, w, h in index['sheets']:
+            if not os.path.isfile(cache_path + file) or os.path.getsize(cache_path + file) != w * h * 3:
+                return None
+            f = open(cache_path + file, 'rb')
+            pixels = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            sheet = pygame.image.frombuffer(pixels, (w, h), 'RGB').convert()     # the one copy, straight from the mapped file into display format.
+            sheet.set_colorkey((0, 0, 0))
+            pixels.close()
+            f.close()
+            sheets.append(sheet)
+        return cls(index, sheets)
+
+    def image(self, path):
+        return self.images.get(path)
+
+    def folder(self, path):
+        return self.folders.get(path.rstrip('/'))
+
+
+if __name__ == '__main__':
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    index = build()
+    print(str(len(index['images'])) + ' images packed into ' + str(len(index['sheets'])) + ' sheet(s) in ' + CACHE_PATH)
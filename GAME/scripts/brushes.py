@@ -0,0 +1,70 @@
+"""
+the editor's brushes. each one only works out which tiles it covers, the editor then sets or removes
+all of them in one go with Tilemap.set_tiles or Tilemap.remove_tiles.
+"""
+from collections import deque
+
+from scripts.tilemap import CHUNK_SHIFT
+
+FLOOD_LIMIT = 65536         # most tiles one flood fill will touch.
+
+
+def line_cells(start, end):
+    """
+    the tiles on a straight line from start to end, both ends included (bresenham's line).
+    """
+    x, y = start
+    dx, dy = abs(end[0] - x), -abs(end[1] - y)
+    step_x, step_y = (1 if end[0] > x else -1), (1 if end[1] > y else -1)
+    error = dx + dy
+    cells = []
+    while True:
+        cells.append((x, y))
+        if x == end[0] and y == end[1]:
+            return cells
+        double = 2 * error
+        if double >= dy:
+            error += dy
+            x += step_x
+        if double <= dx:
+            error += dx
+            y += step_y
+
+
+def rect_cells(start, end):
+    """
+    every tile in the rectangle with start and end as opposite corners.
+    """
+    left, right = min(start[0], end[0]), max(start[0], end[0])
+    top, bottom = min(start[1], end[1]), max(start[1], end[1])
+    return [(x, y) for y in range(top, bottom + 1) for x in range(left, right + 1)]
+
+
+def flood_cells(tilemap, start, limit=FLOOD_LIMIT):
+    """
+    the tiles joined to start, up down left and right, that are the same type as it (any variant), or empty if it's empty.
+    the fill stays inside the chunks the map has, so filling empty space stops at the edges of the map instead of going on forever.
+    """
+    store = tilemap.store
+    if not store.chunks:
+        return []
+    left = min(cx for cx, cy in store.chunks) << CHUNK_SHIFT
+    top = min(cy for cx, cy in store.chunks) << CHUNK_SHIFT
+    right = ((max(cx for cx, cy in store.chunks) + 1) << CHUNK_SHIFT) - 1
+    bottom = ((max(cy for cx, cy in store.chunks) + 1) << CHUNK_SHIFT) - 1
+    start = (int(start[0]), int(start[1]))
+    if not (left <= start[0] <= right and top <= start[1] <= bottom):
+        return []
+
+    type_id = store.get(start[0], start[1]) >> 8
+    seen = {start}
+    queue = deque([start])
+    cells = []
+    while queue and len(cells) < limit:
+        x, y = queue.popleft()
+        cells.append((x, y))
+        for near in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if near not in seen and left <= near[0] <= right and top <= near[1] <= bottom and store.get(near[0], near[1]) >> 8 == type_id:
+                seen.add(near)
+                queue.append(near)
+    return cells
@@ -1,4 +1,10 @@
+import math
 import random
+from array import array
+
+import pygame
+
+CLOUD_BANDS = 4             # depths the clouds are grouped into. a band moves as one, so it's one blit however many clouds are in it.
 
 
 class Cloud:
@@ -8,18 +14,49 @@ class Cloud:
         self.speed = speed
         self.depth = depth
 
-    def update(self):
-        self.pos[0] += self.speed
 
-    def render(self, surf, offset=(0, 0)):
-        # multiplying offest by depth to make a parsllax effect, so clouds further away move less quickly to make depth.
-        render_pos = (self.pos[0] - offset[0] * self.depth, self.pos[1] - offset[1] * self.depth)
-        # mod operater is used to make a 'loop' for the clouds so they just repeat, size of cloud is also included in making it loop, so that cloud is fully off screen.
-        surf.blit(self.img, (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(), render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height()))
+class CloudBand:
+    """
+    the clouds at one depth. they're drawn once into a tile that repeats across and down the sky, and the tile
+    is drawn 2x2 into a strip, so whatever part of the sky is on screen is one rectangle of the strip.
+    """
+    def __init__(self, depth, speed):
+        self.depth = depth
+        self.speed = speed
+        self.clouds = []
+        self.drift = 0          # how far the wind has blown the band, in pixels.
+        self.strip = None
+        self.view_size = None   # the screen size the strip was made for.
+
+    def build(self, view_size, cloud_size):
+        # like the old per cloud wrap, a cloud goes all the way off one side before it comes back on the other.
+        self.period = (view_size[0] + cloud_size[0], view_size[1] + cloud_size[1])
+        self.cloud_size = cloud_size
+        tile = pygame.Surface(self.period)
+        for cloud in self.clouds:
+            x, y = int(cloud.pos[0] % self.period[0]), int(cloud.pos[1] % self.period[1])
+            for dx in (0, -self.period[0]):             # a cloud over the tile's edge comes in again on the other side.
+                for dy in (0, -self.period[1]):
+                    tile.blit(cloud.img, (x + dx, y + dy))
+        self.strip = pygame.Surface((self.period[0] + view_size[0], self.period[1] + view_size[1]))
+        for x in (0, self.period[0]):
+            for y in (0, self.period[1]):
+                self.strip.blit(tile, (x, y))
+        self.strip.set_colorkey((0, 0, 0), pygame.RLEACCEL)        # run length encoded, blitting skips the empty sky instead of checking every pixel.
+        self.view_size = view_size
+
+    def area(self, offset):
+        """
+        the rect of the strip that's on screen. multiplying offset by depth makes the parallax, bands further away move less.
+        its corner only moves in whole pixels, so it says when the band looks different.
+        """
+        x = math.floor(self.cloud_size[0] - self.drift + offset[0] * self.depth) % self.period[0]
+        y = math.floor(self.cloud_size[1] + offset[1] * self.depth) % self.period[1]
+        return pygame.Rect(x, y, self.view_size[0], self.view_size[1])
 
 
 class Clouds:
-    def __init__(self, cloud_images, count=16) -> None:
+    def __init__(self, cloud_images, count=16, bands=CLOUD_BANDS) -> None:
         self.clouds = []
 
         for i in range(count):
@@ -29,10 +66,68 @@ class Clouds:
         # key determines how you sort things, we are sorting by depth with a lambda function, clouds that are closest to the camera will be pushed to the front, slowest will be in the back.
         self.clouds.sort(key=lambda x: x.depth)
 
-    def update(self):
+        # each cloud goes in the band nearest its depth, a band drifts at the average speed of its clouds.
+        self.bands = [CloudBand(0.2 + 0.6 * (i + 0.5) / bands, 0.075) for i in range(bands)]
         for cloud in self.clouds:
-            cloud.update()
+            self.bands[min(bands - 1, int((cloud.depth - 0.2) / 0.6 * bands))].clouds.append(cloud)
+        for band in self.bands:
+            if band.clouds:
+                band.speed = sum(cloud.speed for cloud in band.clouds) / len(band.clouds)
+        self.bands = [band for band in self.bands if band.clouds]
+        self.cloud_size = (max(img.get_width() for img in cloud_images), max(img.get_height() for img in cloud_images))
+
+    def update(self):
+        for band in self.bands:
+            band.drift += band.speed
+
+    def snapshot(self):
+        """
+        the only thing that changes is how far each band has drifted, one number per band.
+        """
+        return array('d', [band.drift for band in self.bands])
+
+    def restore(self, snapshot):
+        for band, drift in zip(self.bands, snapshot):
+            band.drift = drift
+
+    def views(self, view_size, offset=(0, 0)):
+        """
+        (strip, area) for each band far to near, blitting area of each strip in order draws the clouds.
+        """
+        views = []
+        for band in self.bands:
+            if band.view_size != view_size:
+                band.build(view_size, self.cloud_size)
+            views.append((band.strip, band.area(offset)))
+        return views
 
     def render(self, surf, offset=(0, 0)):
-        for cloud in self.clouds:
-            cloud.render(surf, offset=offset)
+        for strip, area in self.views(surf.get_size(), offset):
+            surf.blit(strip, (0, 0), area)
+
+
+class Backdrop:
+    """
+    the background picture with the clouds over it, kept in one surface. it's only drawn again when a cloud band
+    has moved a whole pixel, the rest of the time drawing the sky is a single blit.
+    """
+    def __init__(self, background, clouds):
+        self.background = background
+        self.clouds = clouds
+        self.base = None        # the part of the background that's on screen, with no colorkey it copies straight across.
+        self.surface = None
+        self.areas = None       # where each band was when self.surface was drawn.
+
+    def render(self, surf, offset=(0, 0)):
+        views = self.clouds.views(surf.get_size(), offset)
+        areas = [area for strip, area in views]
+        if self.surface is None or self.surface.get_size() != surf.get_size() or areas != self.areas:
+            if self.surface is None or self.surface.get_size() != surf.get_size():
+                self.surface = pygame.Surface(surf.get_size())
+                self.base = pygame.Surface(surf.get_size())
+                self.base.blit(self.background, (0, 0))
+            self.surface.blit(self.base, (0, 0))
+            for strip, area in views:
+                self.surface.blit(strip, (0, 0), area)
+            self.areas = areas
+        surf.blit(self.surface, (0, 0))
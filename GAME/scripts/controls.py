@@ -0,0 +1,59 @@
+import json
+
+import pygame
+
+# keyboard keys -> the name of what they do in the game. Game.apply_input works with the names,
+# so anything that can make names (the keyboard, a script, a replay) can drive the game.
+KEY_ACTIONS = {
+    pygame.K_a: 'left',
+    pygame.K_d: 'right',
+    pygame.K_SPACE: 'jump',
+    pygame.K_x: 'dash',
+    pygame.K_LEFT: 'matt_left',
+    pygame.K_RIGHT: 'matt_right',
+    pygame.K_UP: 'matt_jump',
+    pygame.K_DOWN: 'matt_angry',
+    pygame.K_j: 'potts_left',
+    pygame.K_l: 'potts_right',
+    pygame.K_i: 'potts_jump',
+    pygame.K_m: 'potts_milk',
+    pygame.K_k: 'potts_surprised',
+    pygame.K_F3: 'profiler',
+    pygame.K_F4: 'profiler_dump',
+}
+
+
+class KeyboardInput:
+    """
+    live input, turns this frame's pygame events into (action, pressed) pairs.
+    """
+    def poll(self, frame):
+        actions = []
+        # prevent computer from thinking program is not responding by constantly querying pygame.event
+        for event in pygame.event.get():
+            if event.type in (pygame.QUIT, pygame.WINDOWCLOSE):        # pygame.QUIT is clicking X in the window, the SDL renderer's window sends WINDOWCLOSE.
+                actions.append(('quit', True))
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in KEY_ACTIONS:     # pygame.KEYDOWN is for any key being pressed.
+                actions.append((KEY_ACTIONS[event.key], event.type == pygame.KEYDOWN))
+        return actions
+
+
+class ScriptedInput:
+    """
+    input from a fixed script instead of a person, for running the game with no display.
+    the script is a list of [frame, action, pressed], e.g. [[10, 'right', True], [40, 'jump', True], [90, 'right', False]].
+    """
+    def __init__(self, script=()):
+        self.frames = {}
+        for frame, action, pressed in script:
+            self.frames.setdefault(int(frame), []).append((action, bool(pressed)))
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, 'r')
+        script = json.load(f)
+        f.close()
+        return cls(script)
+
+    def poll(self, frame):
+        return self.frames.get(frame, [])
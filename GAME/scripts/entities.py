@@ -1,12 +1,15 @@
 import math
 import random
+import struct
 
 import pygame
 
-from scripts.particle import Particle
-from scripts.spark import Spark
 
 class PhysicsEntity:
+    # the state that changes while playing, packed into bytes by snapshot(). pos, prev_pos, velocity and last_movement,
+    # then flip, the four collision flags, the animation's frame and whether it's done. subclasses add theirs on the end.
+    STATE = struct.Struct('<8d5?i?')
+
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type          # type is builtin function, so using e_type
@@ -21,6 +24,38 @@ class PhysicsEntity:
         self.set_action('idle')             # set which animation we are currently using.
 
         self.last_movement = [0, 0]
+        self.prev_pos = list(self.pos)          # position at the start of the last update, render blends between this and pos.
+
+    def place(self, pos):
+        """
+        move straight to a spot (spawning, respawning) without render sliding there from the old position.
+        """
+        self.pos = list(pos)
+        self.prev_pos = list(pos)
+
+    def state(self):
+        return (self.pos[0], self.pos[1], self.prev_pos[0], self.prev_pos[1], self.velocity[0], self.velocity[1], self.last_movement[0], self.last_movement[1],
+                self.flip, self.collisions['up'], self.collisions['down'], self.collisions['right'], self.collisions['left'], self.animation.frame, self.animation.done)
+
+    def set_state(self, values):
+        self.pos = [values[0], values[1]]
+        self.prev_pos = [values[2], values[3]]
+        self.velocity = [values[4], values[5]]
+        self.last_movement = (values[6], values[7])
+        self.flip = values[8]
+        self.collisions = {'up': values[9], 'down': values[10], 'right': values[11], 'left': values[12]}
+        self.animation.frame, self.animation.done = values[13], values[14]
+
+    def snapshot(self):
+        """
+        (action, packed bytes) of everything that changes while playing, see restore.
+        """
+        return self.action, self.STATE.pack(*self.state())
+
+    def restore(self, snapshot):
+        action, data = snapshot
+        self.set_action(action)
+        self.set_state(self.STATE.unpack(data))
 
     def rect(self):
         """
@@ -45,15 +80,13 @@ class PhysicsEntity:
         we are trying to be compatible with all versions
         of pygame, so we are using our own position instead.
         """
+        self.prev_pos[0], self.prev_pos[1] = self.pos[0], self.pos[1]
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}           # Reset collisions each frame
         frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
-        tiles = tilemap.tiles_around(self.pos, self.size)
-        rects = tilemap.physics_rects_around(self.pos, self.size)
+        rects = tilemap.physics_rects_around(self.pos, self.size)       # cached rects, nothing gets built here.
         # Actual movement right here !!!
         self.pos[0] += frame_movement[0]
         entity_rect = self.rect()
-        top_left_x = int(self.pos[0] // tilemap.tile_size)-1
-        top_left_y = int(self.pos[1] // tilemap.tile_size)-1
         # tiles = tilemap.tiles_around(self.pos, self.size)
         # rects = tilemap.physics_rects_around(self.pos, self.size)
         # if self.size == (12, 29):
@@ -102,19 +135,31 @@ class PhysicsEntity:
         #if self.size == (12, 29):
             #print(f'FRAME: {self.animation.frame}')
 
-    def render(self, surf, offset=(0, 0)):                      # x-axis, y-axis               camera offset   anim offset 
-        surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False), (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))            # pygame transform can flip the image.
+    def render(self, surf, offset=(0, 0), alpha=1.0):
+        # alpha is how far we are between the last two simulation ticks, 0 is where we were, 1 is where we are now. Drawing in between keeps movement smooth when the screen refreshes faster than the simulation.
+        pos = (self.prev_pos[0] + (self.pos[0] - self.prev_pos[0]) * alpha, self.prev_pos[1] + (self.pos[1] - self.prev_pos[1]) * alpha)
+                                                                # x-axis, y-axis               camera offset   anim offset 
+        surf.blit(self.animation.img(self.flip), (pos[0] - offset[0] + self.anim_offset[0], pos[1] - offset[1] + self.anim_offset[1]))            # the animation already has mirrored frames, so no flipping (or new surface) every frame.
 
 
 class Enemy(PhysicsEntity):
+    STATE = struct.Struct(PhysicsEntity.STATE.format + 'i')        # walking
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'enemy', pos, size)
 
         self.walking = 0
 
+    def state(self):
+        return super().state() + (self.walking,)
+
+    def set_state(self, values):
+        super().set_state(values)
+        self.walking = values[-1]
+
     def update(self, tilemap, movement=(0, 0)):
         if self.walking:
-            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):        # we're looking 7 pixels to left or right, also looking 23 pixels into the ground
+            if tilemap.is_solid((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):        # we're looking 7 pixels to left or right, also looking 23 pixels into the ground
                 if (self.collisions['right'] or self.collisions['left']):       # if you run into something you turn around, otherwise just walk
                     self.flip = not self.flip
                 else:
@@ -126,13 +171,15 @@ class Enemy(PhysicsEntity):
                 dis = (self.game.player.pos[0] - self.pos[0], self.game.player.pos[1] - self.pos[1])
                 if (abs(dis[1]) < 32):       # if the y axis offset is less than 16 pixels.
                     if (self.flip and dis[0] < 0):      # if the player is towards the left and we're looking left, dis should be negative for left facing
-                        self.game.projectiles.append([[self.rect().centerx - 7, self.rect().centery], -1.5, 0])
+                        muzzle = (self.rect().centerx - 7, self.rect().centery)
+                        self.game.projectiles.spawn(muzzle, (-1.5, 0))
                         for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5 + math.pi, 2 + random.random())) # facing left
+                            self.game.sparks.spawn(muzzle, random.random() - 0.5 + math.pi, 2 + random.random()) # facing left
                     if (not self.flip and dis[0] > 0):
-                        self.game.projectiles.append([[self.rect().centerx + 7, self.rect().centery], 1.5, 0])
+                        muzzle = (self.rect().centerx + 7, self.rect().centery)
+                        self.game.projectiles.spawn(muzzle, (1.5, 0))
                         for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5, 2 + random.random())) # facing right
+                            self.game.sparks.spawn(muzzle, random.random() - 0.5, 2 + random.random()) # facing right
 
         elif random.random() < 0.01:            # random.random() generates a num between 0 and 1, so 1% chance of occuring, if we're not walking, 1 in every 1.67 seconds at 60fps if we're not walking.
             self.walking = random.randint(30, 120)      #between half a second (30) to two seconds (120)
@@ -147,13 +194,16 @@ class Enemy(PhysicsEntity):
         if abs(self.game.player.dashing) >= 50:         # if in frames where you're actually dashing
             if self.rect().colliderect(self.game.player.rect()):        # the player hit an enemy with a dash.
                 self.game.screenshake = max(16, self.game.screenshake)
+                spark_angles, spark_speeds = [], []
                 for i in range(30):     # spawning 30 sparks
                     angle = random.random() * math.pi * 2
                     speed = random.random() * 5
-                    self.game.sparks.append(Spark(self.rect().center, angle, 2 + random.random()))
-                    self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7)))
-                self.game.sparks.append(Spark(self.rect().center, 0, 5 + random.random()))
-                self.game.sparks.append(Spark(self.rect().center, math.pi, 5 + random.random()))
+                    spark_angles.append(angle)
+                    spark_speeds.append(2 + random.random())
+                    self.game.particles.spawn('particle', self.rect().center, velocity=[math.cos(angle + math.pi) * speed * 0.5, math.sin(angle + math.pi) * speed * 0.5], frame=random.randint(0, 7))
+                spark_angles += [0, math.pi]
+                spark_speeds += [5 + random.random(), 5 + random.random()]
+                self.game.sparks.spawn_many(self.rect().center, spark_angles, spark_speeds)     # the whole burst goes in as one block
                 return True
 
 
@@ -173,6 +223,8 @@ class Enemy(PhysicsEntity):
 
 
 class Player(PhysicsEntity):
+    STATE = struct.Struct(PhysicsEntity.STATE.format + 'ii?i')     # air_time, jumps, wall_slide, dashing
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'player', pos, size)
         self.air_time = 0
@@ -180,6 +232,13 @@ class Player(PhysicsEntity):
         self.wall_slide = False
         self.dashing = 0
 
+    def state(self):
+        return super().state() + (self.air_time, self.jumps, self.wall_slide, self.dashing)
+
+    def set_state(self, values):
+        super().set_state(values)
+        self.air_time, self.jumps, self.wall_slide, self.dashing = values[-4:]
+
     def update(self, tilemap, movement=(0, 0)):
         super().update(tilemap, movement=movement)
 
@@ -219,7 +278,7 @@ class Player(PhysicsEntity):
                 angle = random.random() * math.pi * 2       # this is the full circle of angles in radians, picking a random angle in the circle
                 speed = random.random() * 0.5 + 0.5         # random speed between 0.5 and 1
                 pvelocity = [math.cos(angle) * speed, math.sin(angle) * speed]      # cos is for x axis, sin is for y axis, generates a velocity based on the angle. based on trigonometry. take angle of what you want to move times the speed you want to move. This covers most trigonometry for games. arctangent turns x and y coordinates into angles, which would be another thing you may need.
-                self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+                self.game.particles.spawn('particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7))
         if self.dashing > 0:
             self.dashing = max(0, self.dashing - 1)     # manage dashing so it goes towards zero but not below it
         if self.dashing < 0:
@@ -230,7 +289,7 @@ class Player(PhysicsEntity):
                 self.velocity[0] *= 0.1
             # streaming particles.
             pvelocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]        # player velocity, abs divided by self is giving the direction, random number from 1 - 3 int he direction we are dashing, so the stream of particles moves in the direction of the movement. Only in x axis not y axis
-            self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7)))
+            self.game.particles.spawn('particle', self.rect().center, velocity=pvelocity, frame=random.randint(0, 7))
 
         # making sure velocity is zero'd out after jumping
         if self.velocity[0] > 0:
@@ -258,9 +317,9 @@ class Player(PhysicsEntity):
             self.jumps -= 1
             self.air_time = 5       # automatically forces it to go to jump animation since its > 4.
 
-    def render(self, surf, offset=(0, 0)):       # for adding dashing to player with new render animation.
+    def render(self, surf, offset=(0, 0), alpha=1.0):       # for adding dashing to player with new render animation.
         if abs(self.dashing) <= 50:     # this is accounting for both directions with abs(), if we're in the first ten frames of the dash.
-            super().render(surf, offset=offset)     # we're gating the rendering function of PhysicsEntity
+            super().render(surf, offset=offset, alpha=alpha)     # we're gating the rendering function of PhysicsEntity
 
     def dash(self):
         if not self.dashing:
@@ -271,12 +330,21 @@ class Player(PhysicsEntity):
 
 
 class Matt(PhysicsEntity):
+    STATE = struct.Struct(PhysicsEntity.STATE.format + 'ii?')      # air_time, jumps, angry
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'matt', pos, size)
         self.air_time = 0
         self.jumps = 1
         self.angry = False
 
+    def state(self):
+        return super().state() + (self.air_time, self.jumps, self.angry)
+
+    def set_state(self, values):
+        super().set_state(values)
+        self.air_time, self.jumps, self.angry = values[-3:]
+
     def update(self, tilemap, movement=(0, 0)):
         super().update(tilemap, movement=movement)
 
@@ -311,11 +379,13 @@ class Matt(PhysicsEntity):
             self.jumps -= 1
             self.air_time = 5       # automatically forces it to go to jump animation since its > 4.
 
-    def render(self, surf, offset=(0, 0)):       # for adding dashing to player with new render animation.
-        super().render(surf, offset=offset)     # we're gating the rendering function of PhysicsEntity
+    def render(self, surf, offset=(0, 0), alpha=1.0):       # for adding dashing to player with new render animation.
+        super().render(surf, offset=offset, alpha=alpha)     # we're gating the rendering function of PhysicsEntity
 
 
 class Potts(PhysicsEntity):
+    STATE = struct.Struct(PhysicsEntity.STATE.format + 'ii??')     # air_time, jumps, milk, surprised
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'potts', pos, size)
         self.air_time = 0
@@ -323,6 +393,13 @@ class Potts(PhysicsEntity):
         self.milk = False
         self.surprised = False
 
+    def state(self):
+        return super().state() + (self.air_time, self.jumps, self.milk, self.surprised)
+
+    def set_state(self, values):
+        super().set_state(values)
+        self.air_time, self.jumps, self.milk, self.surprised = values[-4:]
+
     def update(self, tilemap, movement=(0, 0)):
         super().update(tilemap, movement=movement)
 
@@ -359,5 +436,5 @@ class Potts(PhysicsEntity):
             self.jumps -= 1
             self.air_time = 5       # automatically forces it to go to jump animation since its > 4.
 
-    def render(self, surf, offset=(0, 0)):       # for adding dashing to player with new render animation.
-        super().render(surf, offset=offset)     # we're gating the rendering function of PhysicsEntity
+    def render(self, surf, offset=(0, 0), alpha=1.0):       # for adding dashing to player with new render animation.
+        super().render(surf, offset=offset, alpha=alpha)     # we're gating the rendering function of PhysicsEntity
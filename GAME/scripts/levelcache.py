@@ -0,0 +1,75 @@
+import os
+from array import array
+from collections import OrderedDict
+
+from scripts.tilemap import ChunkCache
+
+
+class LevelSnapshot:
+    """
+    a level just after loading: the tilemap with the spawners already pulled out, where the leaves fall
+    from and what has to be spawned where. taking one and restoring it copies dicts and lists, never tiles,
+    the tile chunks are shared with the tilemap until something writes to them.
+    """
+    def __init__(self, tilemap, leaf_spawners, spawners):
+        self.tilemap = tilemap          # the pre-rendered chunks only belong to this one.
+        self.store = tilemap.store.snapshot()
+        self.type_names = list(tilemap.store.type_names)        # what the type ids in the cells mean.
+        self.tile_size = tilemap.tile_size
+        self.solid_rects = dict(tilemap.solid_rects)       # the rects themselves are never changed, only the dict is.
+        self.offgrid_tiles = list(tilemap.offgrid_tiles)
+        self.chunk_cache = tilemap.chunk_cache      # pre-rendered chunks come along, respawning doesn't redraw the level.
+        self.overhang = tilemap.overhang
+        self.leaf_spawners = [rect.copy() for rect in leaf_spawners]
+        self.spawners = [(spawner['variant'], tuple(spawner['pos'])) for spawner in spawners]
+
+    def restore(self, tilemap):
+        """
+        put the level back in tilemap, returns (leaf spawner rects, spawners) as fresh lists, spawners in the same
+        {'type', 'variant', 'pos'} shape extract gives.
+        """
+        store = tilemap.store
+        ids = [0] + [store.type_id(name) for name in self.type_names[1:]]
+        if ids == list(range(len(ids))):
+            store.restore(self.store)
+        else:           # a different tilemap numbered its types differently, the cells get copied with the ids changed, like load_binary.
+            chunks, counts, size = self.store
+            store.clear()
+            for loc, chunk in chunks.items():
+                store.put_chunk(loc, array('H', [(ids[value >> 8] << 8) | (value & 0xFF) if value else 0 for value in chunk]))
+        tilemap.tile_size = self.tile_size
+        tilemap.solid_rects = dict(self.solid_rects)
+        tilemap.offgrid_tiles = list(self.offgrid_tiles)
+        tilemap.reindex_offgrid()
+        if tilemap is self.tilemap:
+            tilemap.chunk_cache = self.chunk_cache
+            tilemap.overhang = self.overhang
+        else:
+            tilemap.chunk_cache = ChunkCache()
+            tilemap.overhang = None
+        return [rect.copy() for rect in self.leaf_spawners], [{'type': 'spawners', 'variant': variant, 'pos': list(pos)} for variant, pos in self.spawners]
+
+
+class LevelCache:
+    """
+    the last few levels played, by map path. a snapshot is only used while its map file hasn't changed on disk.
+    """
+    def __init__(self, limit=4):
+        self.limit = limit
+        self.snapshots = OrderedDict()          # path -> (modified time, snapshot), least recently played first.
+
+    def get(self, path):
+        entry = self.snapshots.get(path)
+        if entry is None or entry[0] != os.path.getmtime(path):
+            return None
+        self.snapshots.move_to_end(path)
+        return entry[1]
+
+    def put(self, path, snapshot):
+        self.snapshots[path] = (os.path.getmtime(path), snapshot)
+        self.snapshots.move_to_end(path)
+        while len(self.snapshots) > self.limit:
+            self.snapshots.popitem(last=False)
+
+    def clear(self):
+        self.snapshots.clear()
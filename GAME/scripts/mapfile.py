@@ -0,0 +1,189 @@
+"""
+binary maps, the same thing as the json maps but laid out so loading is copying bytes instead of parsing text.
+
+    header          magic, version, tile size, chunk shift, how many types, chunks and offgrid tiles
+    type table      the type names, a byte of length then utf-8. type id 1 is the first one, 0 means empty
+    chunk index     chunk x, chunk y and where its cells start in the file, for every chunk that has tiles
+    offgrid         type id, variant, x, y for every offgrid tile, in the order they were placed
+    chunk cells     a chunk is CHUNK_SIZE x CHUNK_SIZE 16 bit cells, type id << 8 | variant, the same as TileStore
+
+the file is memory mapped and only the header, type table and chunk index are read up front,
+a chunk's cells are only read when chunk() asks for them.
+
+    python -m scripts.mapfile               convert every json map in data/maps to a .map next to it
+    python -m scripts.mapfile --verify      and load both back and check they're the same map
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from types import SimpleNamespace
+
+MAGIC = b'TMAP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHBxHII')      # magic, version, tile size, chunk shift, type count, chunk count, offgrid count.
+CHUNK_ENTRY = struct.Struct('<iiI')     # chunk x, chunk y, byte offset of its cells.
+OFFGRID = struct.Struct('<BBdd')        # type id, variant, x, y. positions stay floats, offgrid tiles can sit anywhere.
+MAP_DIR = 'data/maps/'
+
+
+def find_map(map_id, map_dir=MAP_DIR):
+    """
+    path of a map by name. the .map is used when there is one at least as new as the .json,
+    the editor saves json, so a map edited after converting loads the edited version.
+    """
+    json_path = map_dir + str(map_id) + '.json'
+    binary_path = map_dir + str(map_id) + '.map'
+    if os.path.exists(binary_path) and (not os.path.exists(json_path) or os.path.getmtime(binary_path) >= os.path.getmtime(json_path)):
+        return binary_path
+    return json_path
+
+
+def write_map(path, tile_size, chunk_shift, type_names, chunks, offgrid_tiles):
+    """
+    type_names is a TileStore's, index = type id with None at 0. chunks are {(chunk x, chunk y): array('H')} packed with those ids.
+    """
+    type_names = list(type_names)
+    type_ids = {name: i for i, name in enumerate(type_names) if name is not None}
+    for tile in offgrid_tiles:
+        if tile['type'] not in type_ids:
+            type_ids[tile['type']] = len(type_names)
+            type_names.append(tile['type'])
+
+    table = b''.join(struct.pack('<B', len(name.encode('utf-8'))) + name.encode('utf-8') for name in type_names[1:])
+    offgrid = b''.join(OFFGRID.pack(type_ids[tile['type']], tile['variant'], tile['pos'][0], tile['pos'][1]) for tile in offgrid_tiles)
+    locs = sorted((loc for loc in chunks if any(chunks[loc])), key=lambda loc: (loc[1], loc[0]))
+    start = HEADER.size + len(table) + CHUNK_ENTRY.size * len(locs) + len(offgrid)
+    start += start % 2          # cells are 16 bit, keep them aligned.
+    cell_bytes = 2 << (2 * chunk_shift)
+
+    f = open(path, 'wb')
+    f.write(HEADER.pack(MAGIC, VERSION, tile_size, chunk_shift, len(type_names) - 1, len(locs), len(offgrid_tiles)))
+    f.write(table)
+    for i, loc in enumerate(locs):
+        f.write(CHUNK_ENTRY.pack(loc[0], loc[1], start + i * cell_bytes))
+    f.write(offgrid)
+    f.write(bytes(start - f.tell()))
+    for loc in locs:
+        cells = array('H', chunks[loc])
+        if sys.byteorder == 'big':
+            cells.byteswap()
+        f.write(cells.tobytes())
+    f.close()
+
+
+class MapFile:
+    """
+    an open binary map. reading the header, types and chunk index is all that happens here,
+    chunk() and offgrid() pull the rest out of the mapped file when they're called.
+    """
+    def __init__(self, path):
+        self.path = path
+        f = open(path, 'rb')
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.close()
+        magic, version, self.tile_size, self.chunk_shift, type_count, chunk_count, self.offgrid_count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a map file this version can read')
+
+        at = HEADER.size
+        self.type_names = [None]
+        for i in range(type_count):
+            length = self.data[at]
+            self.type_names.append(self.data[at + 1:at + 1 + length].decode('utf-8'))
+            at += 1 + length
+        self.chunk_offsets = {}
+        for i in range(chunk_count):
+            cx, cy, offset = CHUNK_ENTRY.unpack_from(self.data, at)
+            self.chunk_offsets[(cx, cy)] = offset
+            at += CHUNK_ENTRY.size
+        self.offgrid_start = at
+
+    def chunk(self, loc):
+        """
+        the cells of one chunk as a fresh array('H'), None if that chunk is empty.
+        """
+        offset = self.chunk_offsets.get(loc)
+        if offset is None:
+            return None
+        cells = array('H')
+        cells.frombytes(self.data[offset:offset + (2 << (2 * self.chunk_shift))])
+        if sys.byteorder == 'big':
+            cells.byteswap()
+        return cells
+
+    def offgrid(self):
+        tiles = []
+        for type_id, variant, x, y in OFFGRID.iter_unpack(self.data[self.offgrid_start:self.offgrid_start + OFFGRID.size * self.offgrid_count]):
+            tiles.append({'type': self.type_names[type_id], 'variant': variant, 'pos': [x, y]})
+        return tiles
+
+    def tiles(self):
+        """
+        every on grid tile as (x, y, type name, variant), for when the chunks can't be copied across as they are.
+        """
+        size = 1 << self.chunk_shift
+        for (cx, cy) in self.chunk_offsets:
+            for i, value in enumerate(self.chunk((cx, cy))):
+                if value:
+                    yield cx * size + i % size, cy * size + i // size, self.type_names[value >> 8], value & 0xFF
+
+    def used(self):
+        """
+        every (type name, variant) in the map, on grid and offgrid.
+        """
+        values = set()
+        for loc in self.chunk_offsets:
+            values.update(self.chunk(loc))
+        values.discard(0)
+        return {(self.type_names[value >> 8], value & 0xFF) for value in values} | {(tile['type'], tile['variant']) for tile in self.offgrid()}
+
+    def close(self):
+        self.data.close()
+
+
+def convert(map_dir=MAP_DIR, verify=False):
+    """
+    write a .map for every .json in map_dir. with verify, load each pair back and compare every tile.
+    returns the names that didn't match.
+    """
+    from scripts.tilemap import Tilemap
+    no_game = SimpleNamespace(assets={})        # no images needed, offgrid tiles just get indexed as tile sized squares.
+
+    mismatched = []
+    for name in sorted(os.listdir(map_dir)):
+        if not name.endswith('.json'):
+            continue
+        json_map = Tilemap(no_game)
+        json_map.load(map_dir + name)
+        binary_path = map_dir + name[:-len('.json')] + '.map'
+        json_map.save(binary_path)
+        line = name + ' -> ' + binary_path + '  ' + str(os.path.getsize(map_dir + name)) + ' -> ' + str(os.path.getsize(binary_path)) + ' bytes'
+        if verify:
+            binary_map = Tilemap(no_game)
+            binary_map.load(binary_path)
+            f = open(map_dir + name, 'r')
+            raw = json.load(f)          # the file itself, not just what Tilemap made of it.
+            f.close()
+            same = raw == {'tilemap': dict(binary_map.tilemap), 'tile_size': binary_map.tile_size, 'offgrid': binary_map.offgrid_tiles}
+            same = same and dict(json_map.tilemap) == dict(binary_map.tilemap) and json_map.offgrid_tiles == binary_map.offgrid_tiles
+            again = binary_path + '.check.map'         # and saving the loaded copy gives back the same bytes.
+            binary_map.save(again)
+            f = open(binary_path, 'rb')
+            g = open(again, 'rb')
+            same = same and f.read() == g.read()
+            f.close()
+            g.close()
+            os.remove(again)
+            line += '  ok' if same else '  MISMATCH'
+            if not same:
+                mismatched.append(name)
+        print(line)
+    return mismatched
+
+
+if __name__ == '__main__':
+    if convert(verify='--verify' in sys.argv):
+        sys.exit(1)
@@ -1,24 +1,128 @@
-class Particle:                                             # frame to start on
-    def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
+import numpy as np
+
+
+class ParticleSystem:
+    """
+    Every particle in the game stored in numpy arrays, one array per field instead of one object per particle,
+    so updating them is a handful of array operations no matter how many there are.
+    each particle counts frames through its animation, moves by its velocity, leaves sway, and
+    particles get drawn one last time on the frame their animation finishes, then removed.
+    """
+    def __init__(self, game, p_types=('leaf', 'particle'), capacity=256):
         self.game = game
-        self.type = p_type
-        self.pos = list(pos)            # list is making a copy
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
+        self.type_ids = {}
+        self.images = []                # every frame of every particle type in one list, indexed by frame_base[type] + frame // duration
+        frame_base, durations, last_frames, loops = [], [], [], []
+        for p_type in p_types:
+            animation = game.assets['particle/' + p_type]
+            self.type_ids[p_type] = len(frame_base)
+            frame_base.append(len(self.images))
+            self.images += animation.images
+            durations.append(animation.img_duration)
+            last_frames.append(animation.img_duration * len(animation.images) - 1)
+            loops.append(animation.loop)
+        self.frame_base = np.array(frame_base)
+        self.durations = np.array(durations)
+        self.last_frames = np.array(last_frames)
+        self.loops = np.array(loops)
+        self.half_sizes = np.array([(img.get_width() // 2, img.get_height() // 2) for img in self.images]).reshape(-1, 2)
+        self.image_table = np.empty(len(self.images), dtype=object)      # object array so picking every particle's image is one numpy index.
+        self.image_table[:] = self.images
+        self.max_size = max([max(img.get_size()) for img in self.images] + [1])
+        self.leaf = self.type_ids.get('leaf', -1)
 
-    def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        self.type = np.zeros(capacity, dtype=np.int8)
+        self.done = np.zeros(capacity, dtype=bool)      # animation reached its last frame, same as Animation.done
+        self.kill = np.zeros(capacity, dtype=bool)      # done on the last update, these are drawn once more then removed.
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        capacity = len(self.frame) * 2
+        for name in ('pos', 'velocity', 'frame', 'type', 'done', 'kill'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, p_type, pos, velocity=(0, 0), frame=0):
+        if self.count == len(self.frame):
+            self.grow()
+        i = self.count
+        self.pos[i] = pos
+        self.velocity[i] = velocity
+        self.frame[i] = frame
+        self.type[i] = self.type_ids[p_type]
+        self.done[i] = False
+        self.kill[i] = False
+        self.count += 1
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+    def clear(self):
+        self.count = 0
+
+    def snapshot(self):
+        """
+        copies of the live part of every array, restore puts them back. only the particles that exist get copied.
+        """
+        n = self.count
+        return tuple(getattr(self, name)[:n].copy() for name in ('pos', 'velocity', 'frame', 'type', 'done', 'kill'))
+
+    def restore(self, snapshot):
+        n = len(snapshot[0])
+        while len(self.frame) < n:
+            self.grow()
+        for name, array in zip(('pos', 'velocity', 'frame', 'type', 'done', 'kill'), snapshot):
+            getattr(self, name)[:n] = array
+        self.count = n
+
+    def compact(self):
+        """
+        drop the particles flagged last update by keeping everything else, no per particle list.remove.
+        """
+        n = self.count
+        alive = ~self.kill[:n]
+        if alive.all():
+            return
+        keep = int(alive.sum())
+        for name in ('pos', 'velocity', 'frame', 'type', 'done', 'kill'):
+            array = getattr(self, name)
+            array[:keep] = array[:n][alive]
+        self.count = keep
+
+    def update(self):
+        self.compact()
+        n = self.count
+        if not n:
+            return
+        types = self.type[:n]
+        self.kill[:n] = self.done[:n]       # a particle that finished last frame gets killed this frame.
+        self.pos[:n] += self.velocity[:n]
 
-        self.animation.update()
+        # Animation.update for everything at once, looping ones wrap around, the rest stop on their last frame.
+        last = self.last_frames[types]
+        frame = self.frame[:n] + 1
+        looping = self.loops[types]
+        frame = np.where(looping, frame % (last + 1), np.minimum(frame, last))
+        self.frame[:n] = frame
+        self.done[:n] |= ~looping & (frame >= last)
 
-        return kill
+        # leaves move back and forth in a smooth pattern, the 0.035 is to make sure you don't go through the loop of the sin function too fast. It always gives a number between -1 and 1.
+        leaves = types == self.leaf
+        self.pos[:n, 0] += np.where(leaves, np.sin(frame * 0.035) * 0.3, 0)
 
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
+        n = self.count
+        if not n:
+            return
+        types = self.type[:n]
+        image_ids = self.frame_base[types] + self.frame[:n] // self.durations[types]
+        corners = self.pos[:n] - offset - self.half_sizes[image_ids]      # centered on the particle
+        # skip anything off screen before building the blit list, that's the only part that is per particle python.
+        visible = (corners[:, 0] > -self.max_size) & (corners[:, 0] < surf.get_width()) & (corners[:, 1] > -self.max_size) & (corners[:, 1] < surf.get_height())
+        corners = corners[visible].astype(np.int64)
+        surf.blits(zip(self.image_table[image_ids[visible]].tolist(), zip(corners[:, 0].tolist(), corners[:, 1].tolist())), doreturn=False)
@@ -0,0 +1,121 @@
+"""
+getting the small display surface everything is drawn on into the window.
+
+    SoftwarePresenter   scales the frame up with pygame.transform.scale on the cpu and blits it to the window, the old way.
+    RendererPresenter   pygame._sdl2.video: the frame is uploaded to a texture and SDL's renderer scales it,
+                        on the graphics card when there is one.
+
+both fit the frame into the window the same way, one of SCALE_MODES:
+    stretch     fill the whole window, what the game always did.
+    integer     the biggest whole number scale that fits, centered with black bars, every pixel comes out the same size.
+    letterbox   the biggest scale that keeps the frame's shape, black bars on two sides.
+
+make_presenter() picks one. both work with SDL's software renderer and the dummy video driver.
+"""
+import pygame
+
+SCALE_MODES = ['stretch', 'integer', 'letterbox']
+BACKENDS = ['auto', 'sdl2', 'software']
+
+
+def fit(display_size, window_size, mode='stretch'):
+    """
+    the rect in the window the frame is scaled into.
+    """
+    if mode == 'stretch':
+        return pygame.Rect((0, 0), window_size)
+    scale = min(window_size[0] / display_size[0], window_size[1] / display_size[1])
+    if mode == 'integer':
+        scale = max(1, int(scale))
+    size = (int(display_size[0] * scale), int(display_size[1] * scale))
+    return pygame.Rect(((window_size[0] - size[0]) // 2, (window_size[1] - size[1]) // 2), size)
+
+
+class SoftwarePresenter:
+    def __init__(self, title, window_size, display_size, mode='stretch'):
+        pygame.display.set_caption(title)
+        self.screen = pygame.display.set_mode(window_size)
+        self.display_size = display_size
+        self.mode = mode
+        self.rect = fit(display_size, window_size, mode)
+        self.scaled = pygame.Surface(self.rect.size, 0, self.screen)       # transform.scale draws into this instead of making a new surface every frame.
+        self.last_offset = None
+
+    def to_display(self, pos):
+        """
+        a window position, like the mouse's, in display pixels.
+        """
+        return ((pos[0] - self.rect.x) * self.display_size[0] / self.rect.width, (pos[1] - self.rect.y) * self.display_size[1] / self.rect.height)
+
+    def present(self, display, offset=(0, 0), rects=None):
+        """
+        offset moves the frame, in window pixels, for screenshake. rects, in display pixels, are the only parts
+        that changed since the last present, for the editor. they're only used when the scale is a whole number,
+        otherwise the edges of the pieces wouldn't line up and the whole frame is scaled.
+        """
+        offset = (int(offset[0]), int(offset[1]))
+        if self.mode != 'stretch' and offset != self.last_offset:
+            self.screen.fill((0, 0, 0))         # the bars, and wherever a shaking frame was last time.
+            rects = None
+        self.last_offset = offset
+        scale_x, scale_y = self.rect.width // self.display_size[0], self.rect.height // self.display_size[1]
+        if rects is not None and not offset and self.rect.size == (self.display_size[0] * scale_x, self.display_size[1] * scale_y):
+            updated = []
+            for rect in rects:
+                window_rect = pygame.Rect(self.rect.x + rect.x * scale_x, self.rect.y + rect.y * scale_y, rect.width * scale_x, rect.height * scale_y)
+                self.screen.blit(pygame.transform.scale(display.subsurface(rect), window_rect.size), window_rect)
+                updated.append(window_rect)
+            pygame.display.update(updated)
+            return
+        pygame.transform.scale(display, self.rect.size, self.scaled)
+        self.screen.blit(self.scaled, self.rect.move(offset))      # scale display and show it, 'blit' it, onto the screen.
+        # For updating the display, without this, will just get a black screen
+        pygame.display.update()
+
+
+class RendererPresenter:
+    def __init__(self, title, window_size, display_size, mode='stretch', accelerated=-1, vsync=False):
+        from pygame._sdl2 import video          # in here so a pygame built without it can still fall back to software.
+
+        # SDL won't put a renderer on the window set_mode makes, so that one is a hidden 1x1 that's only there
+        # because .convert() needs a display mode, and the game is shown in a window of its own.
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        self.window = video.Window(title, window_size)
+        try:
+            self.renderer = video.Renderer(self.window, accelerated=accelerated, vsync=vsync)
+            self.texture = video.Texture(self.renderer, display_size, streaming=True)
+        except Exception:
+            self.window.destroy()
+            raise
+        self.renderer.draw_color = (0, 0, 0, 255)
+        self.display_size = display_size
+        self.rect = fit(display_size, window_size, mode)
+
+    def to_display(self, pos):
+        return ((pos[0] - self.rect.x) * self.display_size[0] / self.rect.width, (pos[1] - self.rect.y) * self.display_size[1] / self.rect.height)
+
+    def present(self, display, offset=(0, 0), rects=None):
+        if rects is None:
+            self.texture.update(display)
+        else:
+            for rect in rects:          # only the changed parts go up to the texture, the scaling is the renderer's job either way.
+                self.texture.update(display.subsurface(rect), area=rect)
+        self.renderer.clear()
+        self.texture.draw(dstrect=self.rect.move(int(offset[0]), int(offset[1])))
+        self.renderer.present()
+
+
+def make_presenter(backend, title, window_size, display_size, mode='stretch'):
+    """
+    backend is one of BACKENDS. 'auto' uses SDL's renderer when it runs on the graphics card and falls back to
+    software scaling otherwise, SDL's own software renderer is slower than pygame.transform.scale.
+    'sdl2' insists on a renderer, any renderer, which is how it gets tested with the dummy driver.
+    """
+    if backend != 'software':
+        try:
+            return RendererPresenter(title, window_size, display_size, mode, accelerated=1 if backend == 'auto' else -1)
+        except (ImportError, RuntimeError, pygame.error) as error:        # _sdl2's errors are RuntimeErrors, not pygame.error.
+            if backend == 'sdl2':
+                raise
+            print('no SDL renderer (' + str(error) + '), scaling in software')
+    return SoftwarePresenter(title, window_size, display_size, mode)
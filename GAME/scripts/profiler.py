@@ -0,0 +1,107 @@
+import time
+from collections import deque
+
+import pygame
+
+OVERLAY_REFRESH = 15        # frames between redrawing the overlay text, rendering fonts every frame would show up in its own numbers.
+
+
+class FrameProfiler:
+    """
+    times each phase of a frame. call begin_frame() at the start, mark('name') at the end of every phase
+    (the time since the last mark goes to that name) and end_frame() once the frame is on screen.
+    while disabled every call returns straight away, so the marks can stay in the game loop for good.
+    a phase marked more than once in a frame (the update phases when a slow frame runs a few ticks) adds up.
+    """
+    def __init__(self, history=240, keep=20000):
+        self.enabled = False
+        self.history = history
+        self.phases = {}            # phase name -> deque of its last `history` frame times, in seconds.
+        self.totals = deque(maxlen=history)
+        self.current = {}
+        self.start = 0
+        self.last = 0
+        self.frame = 0
+        self.rows = deque(maxlen=keep)      # the last `keep` frames' timings, for dump_csv. about two minutes at 144 fps.
+        self.overlay = []           # rendered lines of the overlay, the frame they were made on and the box behind them.
+        self.overlay_frame = -OVERLAY_REFRESH
+        self.box = None
+        self.font = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.current = {}
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.current = {}
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.start
+        self.totals.append(total)
+        for name, seconds in self.current.items():
+            if name not in self.phases:
+                self.phases[name] = deque(maxlen=self.history)
+            self.phases[name].append(seconds)
+        self.rows.append((self.frame, total, self.current))
+        self.frame += 1
+
+    def stats(self):
+        """
+        [(phase name, average ms, p99 ms)] over the history, slowest average first, with the whole frame at the top.
+        """
+        lines = []
+        for name, times in [('frame', self.totals)] + list(self.phases.items()):
+            if times:
+                ordered = sorted(times)
+                lines.append((name, sum(ordered) / len(ordered) * 1000, ordered[int(0.99 * (len(ordered) - 1))] * 1000))
+        return lines[:1] + sorted(lines[1:], key=lambda line: -line[1])
+
+    def render(self, surf, pos=(2, 2)):
+        """
+        draw the overlay, a line per phase of 'name  avg  p99' in milliseconds, on a dark box so it reads over the level.
+        """
+        if not self.enabled:
+            return
+        if self.frame - self.overlay_frame >= OVERLAY_REFRESH:
+            if not self.font:
+                self.font = pygame.font.Font(None, 12)
+            self.overlay = [self.font.render('phase         avg ms   p99 ms', False, (255, 255, 255))]
+            for name, average, p99 in self.stats():
+                self.overlay.append(self.font.render(f'{name[:12]:<12} {average:7.2f} {p99:8.2f}', False, (255, 255, 255)))
+            self.overlay_frame = self.frame
+            self.box = pygame.Surface((max(line.get_width() for line in self.overlay) + 4, sum(line.get_height() for line in self.overlay) + 4))
+            self.box.set_alpha(160)
+        surf.blit(self.box, pos)
+        y = pos[1] + 2
+        for line in self.overlay:
+            surf.blit(line, (pos[0] + 2, y))
+            y += line.get_height()
+
+    def dump_csv(self, path):
+        """
+        write the kept frames out, one row per frame and a column per phase in milliseconds.
+        returns how many frames were written.
+        """
+        names = []
+        for frame, total, phases in self.rows:
+            for name in phases:
+                if name not in names:
+                    names.append(name)
+        f = open(path, 'w')
+        f.write(','.join(['frame', 'total'] + names) + '\n')
+        for frame, total, phases in self.rows:
+            f.write(','.join([str(frame), f'{total * 1000:.4f}'] + [f'{phases.get(name, 0) * 1000:.4f}' for name in names]) + '\n')
+        f.close()
+        return len(self.rows)
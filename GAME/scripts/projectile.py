@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+
+
+class ProjectilePool:
+    """
+    Every projectile in a fixed block of numpy arrays instead of [[x, y], direction, timer] lists.
+    the pool never grows, spawn just says no when it's full, so a bullet heavy level can't eat memory.
+    hits against tiles walk every grid cell between last frame's position and this frame's,
+    so a fast projectile can't skip over a thin wall.
+    """
+    def __init__(self, capacity=4096, lifetime=360):
+        self.capacity = capacity
+        self.lifetime = lifetime        # frames before a projectile that hit nothing goes away.
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.prev = np.zeros((capacity, 2))     # where each one was before this frame's move, the start of the grid walk.
+        self.velocity = np.zeros((capacity, 2))
+        self.timer = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, pos, velocity):
+        if self.count == self.capacity:
+            return False
+        i = self.count
+        self.pos[i] = pos
+        self.prev[i] = pos
+        self.velocity[i] = velocity
+        self.timer[i] = 0
+        self.count += 1
+        return True
+
+    def clear(self):
+        self.count = 0
+
+    def snapshot(self):
+        n = self.count
+        return self.pos[:n].copy(), self.prev[:n].copy(), self.velocity[:n].copy(), self.timer[:n].copy()
+
+    def restore(self, snapshot):
+        n = len(snapshot[0])
+        for array, saved in zip((self.pos, self.prev, self.velocity, self.timer), snapshot):
+            array[:n] = saved
+        self.count = n
+
+    def remove(self, mask):
+        """
+        drop every projectile where mask is True by keeping the rest, mask covers the live ones.
+        """
+        if not mask.any():
+            return
+        n = self.count
+        keep = ~mask
+        kept = int(keep.sum())
+        for array in (self.pos, self.prev, self.velocity, self.timer):
+            array[:kept] = array[:n][keep]
+        self.count = kept
+
+    def update(self):
+        n = self.count
+        self.prev[:n] = self.pos[:n]
+        self.pos[:n] += self.velocity[:n]
+        self.timer[:n] += 1
+
+    def wall_hits(self, tilemap):
+        """
+        remove projectiles that ran into a solid tile this frame and return [(hit position, velocity)] for them.
+        only ones that crossed into a new cell (or were just fired) get walked, everything else is still in a cell it already checked.
+        """
+        n = self.count
+        if not n:
+            return []
+        tile_size = tilemap.tile_size
+        old_cells = np.floor(self.prev[:n] / tile_size)
+        new_cells = np.floor(self.pos[:n] / tile_size)
+        check = (old_cells != new_cells).any(axis=1) | (self.timer[:n] == 1)
+        hits = []
+        hit_mask = np.zeros(n, dtype=bool)
+        for i in np.flatnonzero(check).tolist():
+            hit = self.grid_walk(tilemap, self.prev[i], self.pos[i], self.timer[i] == 1)
+            if hit is not None:
+                hits.append((hit, (float(self.velocity[i, 0]), float(self.velocity[i, 1]))))
+                hit_mask[i] = True
+        self.remove(hit_mask)
+        return hits
+
+    def grid_walk(self, tilemap, start, end, include_start):
+        """
+        step through the tiles a straight line from start to end crosses, in order, and give back
+        the point where it first enters a solid one (None if it doesn't).
+        with a streamed map every chunk the line goes through is loaded first, so walls in it are there.
+        """
+        tile_size = tilemap.tile_size
+        solid = tilemap.solid_rects
+        streamer = tilemap.streamer
+        x0, y0 = float(start[0]), float(start[1])
+        x1, y1 = float(end[0]), float(end[1])
+        cell_x, cell_y = int(x0 // tile_size), int(y0 // tile_size)
+        end_x, end_y = int(x1 // tile_size), int(y1 // tile_size)
+        if streamer:
+            shift = streamer.chunk_shift
+            streamer.need((cell_x >> shift, cell_y >> shift))
+        if include_start and (cell_x, cell_y) in solid:
+            return (x0, y0)
+        dx, dy = x1 - x0, y1 - y0
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        # how far along the line (0 to 1) until we cross the next vertical and horizontal grid line, and how far between them.
+        next_x = ((cell_x + (dx > 0)) * tile_size - x0) / dx if dx else math.inf
+        next_y = ((cell_y + (dy > 0)) * tile_size - y0) / dy if dy else math.inf
+        delta_x = tile_size / abs(dx) if dx else math.inf
+        delta_y = tile_size / abs(dy) if dy else math.inf
+        while (cell_x, cell_y) != (end_x, end_y):
+            if next_x < next_y:
+                cell_x += step_x
+                t = next_x
+                next_x += delta_x
+            else:
+                cell_y += step_y
+                t = next_y
+                next_y += delta_y
+            if t > 1:           # floating point safety, never walk past the end of this frame's movement.
+                break
+            if streamer:
+                streamer.need((cell_x >> shift, cell_y >> shift))
+            if (cell_x, cell_y) in solid:
+                return (x0 + dx * t, y0 + dy * t)
+        return None
+
+    def expire(self):
+        n = self.count
+        self.remove(self.timer[:n] > self.lifetime)
+
+    def hit_rect(self, rect):
+        """
+        remove every projectile inside rect (same test as rect.collidepoint) and return their positions.
+        """
+        n = self.count
+        if not n:
+            return []
+        x, y = self.pos[:n, 0], self.pos[:n, 1]
+        inside = (x >= rect.left) & (x < rect.right) & (y >= rect.top) & (y < rect.bottom)
+        hits = self.pos[:n][inside].tolist()
+        self.remove(inside)
+        return hits
+
+    def render(self, surf, img, offset=(0, 0), alpha=1.0):
+        n = self.count
+        if not n:
+            return
+        pos = self.prev[:n] + (self.pos[:n] - self.prev[:n]) * alpha        # between the last two ticks, same as PhysicsEntity.render
+        # subtracting half the width gets center. often times when adding something new, if you can't see it, its often because you got the camera stuff wrong.
+        corners = pos - (img.get_width() / 2 + offset[0], img.get_height() / 2 + offset[1])
+        visible = (corners[:, 0] > -img.get_width()) & (corners[:, 0] < surf.get_width()) & (corners[:, 1] > -img.get_height()) & (corners[:, 1] < surf.get_height())
+        corners = corners[visible]
+        surf.blits([(img, corner) for corner in zip(corners[:, 0].tolist(), corners[:, 1].tolist())], doreturn=False)
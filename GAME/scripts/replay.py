@@ -0,0 +1,101 @@
+import struct
+import zlib
+from array import array
+
+# every frame of input is one 16 bit number, a bit per action.
+# held actions stay set for as long as the key is down, press actions are only set on the frame they happen.
+HELD_ACTIONS = ['left', 'right', 'matt_left', 'matt_right', 'potts_left', 'potts_right', 'matt_angry', 'potts_milk', 'potts_surprised']
+PRESS_ACTIONS = ['jump', 'dash', 'matt_jump', 'potts_jump']
+ACTION_BITS = {action: 1 << i for i, action in enumerate(HELD_ACTIONS + PRESS_ACTIONS)}
+HELD_MASK = sum(ACTION_BITS[action] for action in HELD_ACTIONS)
+
+MAGIC = b'RPLY'
+VERSION = 2                  # 2: enemies far from the camera sleep (scripts/activity.py), version 1 replays don't play out the same any more.
+HEADER = struct.Struct('<4sHQI')         # magic, version, rng seed, frame count. the level name and the compressed frames follow.
+
+
+class Recorder:
+    """
+    sits between the game and its real input source, passes everything through and keeps one
+    input state per frame, plus the seed and level, so the run can be played back exactly.
+    """
+    def __init__(self, source, seed, level, path=None):
+        self.source = source
+        self.seed = seed
+        self.level = str(level)
+        self.path = path
+        self.frames = array('H')
+        self.held = 0
+
+    def poll(self, frame):
+        actions = self.source.poll(frame)
+        presses = 0
+        for action, pressed in actions:
+            bit = ACTION_BITS.get(action, 0)
+            if bit & HELD_MASK:
+                self.held = (self.held | bit) if pressed else (self.held & ~bit)
+            elif bit and pressed:
+                presses |= bit
+        self.frames.append(self.held | presses)
+        return actions
+
+    def rewind(self, frame):
+        """
+        the game went back to frame (Game.restore), forget what was recorded from there on.
+        """
+        del self.frames[frame:]
+        self.held = self.frames[-1] & HELD_MASK if self.frames else 0
+
+    def save(self, path=None):
+        path = path if path else self.path
+        level = self.level.encode('utf-8')
+        f = open(path, 'wb')
+        f.write(HEADER.pack(MAGIC, VERSION, self.seed, len(self.frames)))
+        f.write(struct.pack('<H', len(level)) + level)
+        f.write(zlib.compress(self.frames.tobytes(), 9))    # held keys repeat frame after frame, so this squashes down to almost nothing.
+        f.close()
+
+
+class ReplayInput:
+    """
+    plays a recording back as (action, pressed) pairs, frame for frame.
+    start the game with the recording's seed and level or it won't line up.
+    """
+    def __init__(self, frames, seed, level):
+        self.frames = frames
+        self.seed = seed
+        self.level = level
+        self.held = 0
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+        magic, version, seed, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a replay file this version can read')
+        level_len = struct.unpack_from('<H', data, HEADER.size)[0]
+        level = data[HEADER.size + 2:HEADER.size + 2 + level_len].decode('utf-8')
+        frames = array('H')
+        frames.frombytes(zlib.decompress(data[HEADER.size + 2 + level_len:]))
+        return cls(frames[:count], seed, level)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def poll(self, frame):
+        if frame >= len(self.frames):
+            return []
+        state = self.frames[frame]
+        actions = []
+        self.held = self.frames[frame - 1] & HELD_MASK if frame else 0        # from the recording, not the last poll, so playback can jump back to any frame.
+        changed = (state ^ self.held) & HELD_MASK
+        for action in HELD_ACTIONS:
+            if changed & ACTION_BITS[action]:
+                actions.append((action, bool(state & ACTION_BITS[action])))
+        for action in PRESS_ACTIONS:
+            if state & ACTION_BITS[action]:
+                actions.append((action, True))
+        self.held = state & HELD_MASK
+        return actions
@@ -0,0 +1,243 @@
+"""
+saving maps from the editor without stopping it.
+
+    save()          takes a snapshot of the map, which copies no tiles (see TileStore.snapshot), and a worker
+                    thread writes it to a temporary file and renames that over the map, so the map on disk is
+                    always either the old save or the new one, never half of each.
+    the journal     every edit between full saves is appended to <map>.journal as one line of json, that's the
+                    autosave and it costs as much as the edit, not the map. when a save starts the journal is
+                    moved to <map>.journal.saving, once the new map is in place that file goes.
+    recover()       after a crash, finishes a save that was cut off and replays the unsaved edits on top, into the
+                    editor only. the map file only ever gets what o saved, quitting without o still throws edits away.
+"""
+import os
+import json
+import hashlib
+from concurrent import futures
+
+from scripts.mapfile import write_map
+from scripts.tilemap import CHUNK_SHIFT, CHUNK_MASK
+
+
+def file_digest(path):
+    if not os.path.exists(path):
+        return None
+    f = open(path, 'rb')
+    digest = hashlib.sha1(f.read()).hexdigest()
+    f.close()
+    return digest
+
+
+def read_journal(path):
+    """
+    the edits in a journal, a line cut off by a crash halfway through writing it is left out.
+    """
+    ops = []
+    f = open(path, 'r')
+    for line in f:
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            break
+    f.close()
+    return ops
+
+
+def same_tile(a, b):
+    return a['type'] == b['type'] and a['variant'] == b['variant'] and list(a['pos']) == list(b['pos'])
+
+
+class MapSnapshot:
+    """
+    the map as it was when a save started. the tile chunks are shared with the tilemap, which copies
+    a chunk before changing it, so the worker thread can read them while the editor keeps editing.
+    """
+    def __init__(self, tilemap):
+        tilemap.stop_streaming()
+        self.tile_size = tilemap.tile_size
+        self.type_names = list(tilemap.store.type_names)
+        self.chunks = tilemap.store.snapshot()[0]
+        self.offgrid_tiles = [dict(tile) for tile in tilemap.offgrid_tiles]
+
+    def write(self, path):
+        """
+        the same file Tilemap.save would have written, json or binary by the name of the map it's for.
+        """
+        if path.endswith('.map'):
+            write_map(path + '.tmp', self.tile_size, CHUNK_SHIFT, self.type_names, self.chunks, self.offgrid_tiles)
+            return
+        tilemap = {}
+        for (cx, cy), chunk in self.chunks.items():
+            for i, value in enumerate(chunk):
+                if value:
+                    x, y = (cx << CHUNK_SHIFT) | (i & CHUNK_MASK), (cy << CHUNK_SHIFT) | (i >> CHUNK_SHIFT)
+                    tilemap[str(x) + ';' + str(y)] = {'type': self.type_names[value >> 8], 'variant': value & 0xFF, 'pos': [x, y]}
+        f = open(path + '.tmp', 'w')
+        json.dump({'tilemap': tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
+        f.close()
+
+
+def write_snapshot(snapshot, path, journal_path):
+    """
+    runs on the save thread. the digest of the new file goes at the end of the journal it replaces before the rename,
+    so recover() can tell whether a crash happened before the new map was in place or after.
+    """
+    snapshot.write(path)
+    f = open(path + '.tmp', 'ab')
+    os.fsync(f.fileno())
+    f.close()
+    if os.path.exists(journal_path):
+        f = open(journal_path, 'a')
+        f.write(json.dumps({'saved': file_digest(path + '.tmp')}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+    os.replace(path + '.tmp', path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+
+class MapSaver:
+    """
+    saves one map for the editor. the editor calls the record_ functions after every edit, save() when o is pressed
+    and poll() once a frame.
+    """
+    def __init__(self, tilemap, path):
+        self.tilemap = tilemap
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.saving_path = path + '.journal.saving'
+        self.journal = None
+        self.pool = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='save')
+        self.future = None
+        self.save_again = False     # o was pressed while a save was still being written.
+
+    def record(self, op):
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a')
+        self.journal.write(json.dumps(op) + '\n')
+        self.journal.flush()
+
+    def record_tiles(self, positions):
+        """
+        how the tiles at positions are now, None as the type for a removed tile.
+        """
+        if not positions:
+            return
+        tiles = []
+        for pos in positions:
+            tile = self.tilemap.get_tile(pos)
+            tiles.append([pos[0], pos[1], tile['type'], tile['variant']] if tile else [pos[0], pos[1], None, 0])
+        self.record({'tiles': tiles})
+
+    def record_autotile(self):
+        self.record({'autotile': True})         # autotiling the same map gives the same result, replaying it just runs it again.
+
+    def record_offgrid_add(self, tile):
+        self.record({'offgrid_add': tile})
+
+    def record_offgrid_remove(self, tile):
+        self.record({'offgrid_remove': tile})
+
+    def replay(self, op):
+        tilemap = self.tilemap
+        if 'tiles' in op:
+            for x, y, tile_type, variant in op['tiles']:
+                if tile_type is None:
+                    tilemap.remove_tile((x, y))
+                else:
+                    tilemap.set_tile((x, y), tile_type, variant)
+        elif 'autotile' in op:
+            tilemap.autotile()
+        elif 'offgrid_add' in op:
+            tilemap.add_offgrid(op['offgrid_add'])
+        elif 'offgrid_remove' in op:
+            for tile in tilemap.offgrid_tiles:
+                if same_tile(tile, op['offgrid_remove']):
+                    tilemap.remove_offgrid(tile)
+                    break
+
+    def save(self):
+        """
+        start writing the map on the save thread and return straight away.
+        """
+        if self.future and not self.future.done():
+            self.save_again = True
+            return
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.journal_path):
+            if os.path.exists(self.saving_path):        # the last save failed, its edits still aren't in the map so keep them in front of these.
+                f = open(self.journal_path, 'r')
+                edits = f.read()
+                f.close()
+                f = open(self.saving_path, 'a')
+                f.write(edits)
+                f.close()
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.saving_path)
+        self.future = self.pool.submit(write_snapshot, MapSnapshot(self.tilemap), self.path, self.saving_path)
+
+    def poll(self):
+        """
+        once a frame: notice a save that finished, or failed, and start the next one if o was pressed again meanwhile.
+        """
+        if self.future and self.future.done():
+            error = self.future.exception()
+            self.future = None
+            if error:
+                print('saving ' + self.path + ' failed: ' + str(error) + ', the edits are still in ' + self.saving_path)
+            if self.save_again:
+                self.save_again = False
+                self.save()
+
+    def saving(self):
+        return self.future is not None and not self.future.done()
+
+    def wait(self):
+        while self.future or self.save_again:
+            if self.future:
+                futures.wait([self.future])
+            self.poll()
+
+    def recover(self):
+        """
+        call after loading the map. a save that was cut off by a crash is finished, o was pressed for those edits.
+        the edits after it were never saved, they're replayed into the tilemap and stay in the journal, they only
+        get into the map file if o is pressed again. returns how many edits were replayed.
+        """
+        count = 0
+        if os.path.exists(self.saving_path):
+            ops = []
+            digest = file_digest(self.path)
+            for op in read_journal(self.saving_path):
+                if 'saved' in op:
+                    if op['saved'] == digest:       # that save made it, everything before it is already in the map.
+                        ops = []
+                else:
+                    ops.append(op)
+            for op in ops:
+                self.replay(op)
+            count += len(ops)
+            self.future = self.pool.submit(write_snapshot, MapSnapshot(self.tilemap), self.path, self.saving_path)
+            self.wait()
+        if os.path.exists(self.journal_path):
+            ops = read_journal(self.journal_path)
+            for op in ops:
+                self.replay(op)
+            count += len(ops)
+        return count
+
+    def close(self):
+        """
+        on quitting: let a save that's still being written finish, then throw away the edits that weren't saved.
+        """
+        self.wait()
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.pool.shutdown(wait=True)
@@ -1,27 +1,108 @@
-import math
 
+import numpy as np
 import pygame
 
 
-class Spark:
-    def __init__(self, pos, angle, speed):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
+class SparkSystem:
+    """
+    All sparks in a few numpy arrays. cos and sin are worked out once per spark per frame for
+    every spark at once, and the four corners of every polygon come out of the same pass.
+    speed is the timer, a spark is drawn on the frame it hits 0 and removed after.
+    """
+    def __init__(self, capacity=128):
+        self.count = 0
+        self.pos = np.zeros((capacity, 2))
+        self.angle = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.kill = np.zeros(capacity, dtype=bool)
 
-    def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+    def __len__(self):
+        return self.count
+
+    def reserve(self, extra):
+        if self.count + extra <= len(self.speed):
+            return
+        capacity = max(len(self.speed) * 2, self.count + extra)
+        for name in ('pos', 'angle', 'speed', 'kill'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, pos, angle, speed):
+        self.reserve(1)
+        i = self.count
+        self.pos[i] = pos
+        self.angle[i] = angle
+        self.speed[i] = speed
+        self.kill[i] = False
+        self.count += 1
+
+    def spawn_many(self, pos, angles, speeds):
+        """
+        a whole burst from one position in one go, angles and speeds are matching lists.
+        """
+        n = len(angles)
+        self.reserve(n)
+        i = self.count
+        self.pos[i:i + n] = pos
+        self.angle[i:i + n] = angles
+        self.speed[i:i + n] = speeds
+        self.kill[i:i + n] = False
+        self.count += n
 
-        self.speed = max(0, self.speed - 0.1)       # in effect the speed is its timer.
-        return not self.speed           # return true which is the kill signal
+    def clear(self):
+        self.count = 0
+
+    def snapshot(self):
+        n = self.count
+        return tuple(getattr(self, name)[:n].copy() for name in ('pos', 'angle', 'speed', 'kill'))
+
+    def restore(self, snapshot):
+        n = len(snapshot[0])
+        self.count = 0
+        self.reserve(n)
+        for name, array in zip(('pos', 'angle', 'speed', 'kill'), snapshot):
+            getattr(self, name)[:n] = array
+        self.count = n
+
+    def update(self):
+        n = self.count
+        if n and self.kill[:n].any():           # drop last frame's dead sparks by keeping the rest, no list.remove
+            alive = ~self.kill[:n]
+            keep = int(alive.sum())
+            for name in ('pos', 'angle', 'speed', 'kill'):
+                array = getattr(self, name)
+                array[:keep] = array[:n][alive]
+            self.count = n = keep
+        if not n:
+            return
+        speed = self.speed[:n]
+        self.pos[:n, 0] += np.cos(self.angle[:n]) * speed
+        self.pos[:n, 1] += np.sin(self.angle[:n]) * speed
+        np.maximum(0, speed - 0.1, out=speed)       # in effect the speed is its timer.
+        self.kill[:n] = speed == 0
 
     def render(self, surf, offset=(0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-        ]
-                                                    # points of the polygon
-        pygame.draw.polygon(surf, (255, 255, 255), render_points)
\ No newline at end of file
+        n = self.count
+        if not n:
+            return
+        # the four points are out along the angle, then a quarter turn round, a half turn and three quarters,
+        # cos(a + pi/2) is -sin(a) and sin(a + pi/2) is cos(a), so one cos and one sin cover all four.
+        cos = np.cos(self.angle[:n])
+        sin = np.sin(self.angle[:n])
+        long = self.speed[:n] * 3
+        short = self.speed[:n] * 0.5
+        x = self.pos[:n, 0] - offset[0]
+        y = self.pos[:n, 1] - offset[1]
+        points = np.stack([
+            x + cos * long, y + sin * long,
+            x - sin * short, y + cos * short,
+            x - cos * long, y - sin * long,
+            x + sin * short, y - cos * short,
+        ], axis=1).reshape(n, 4, 2)
+        width, height = surf.get_width(), surf.get_height()
+        visible = (points[:, :, 0].max(axis=1) >= 0) & (points[:, :, 0].min(axis=1) < width) & (points[:, :, 1].max(axis=1) >= 0) & (points[:, :, 1].min(axis=1) < height)
+        polygon = pygame.draw.polygon
+        for render_points in points[visible].tolist():      # points of the polygon
+            polygon(surf, (255, 255, 255), render_points)
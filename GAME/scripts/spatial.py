@@ -0,0 +1,89 @@
+class SpatialGrid:
+    """
+    Uniform grid for finding things by area instead of checking every single one.
+    each item is filed under every cell its rect touches, so a query only looks at the cells it covers.
+    items remember the order they went in, and queries hand them back in that order, so draw order doesn't change.
+    """
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.cells = {}             # (cell x, cell y) -> {item id: entry}
+        self.entries = {}           # item id -> [order, item, rect, cells]
+        self.counter = 0
+
+    def cells_for(self, rect):
+        cell_size = self.cell_size
+        left, top = int(rect[0] // cell_size), int(rect[1] // cell_size)
+        right, bottom = int((rect[0] + max(rect[2] - 1, 0)) // cell_size), int((rect[1] + max(rect[3] - 1, 0)) // cell_size)
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def insert(self, item, rect):
+        key = id(item)          # tiles are dicts, they can't be hashed, so we go by identity.
+        if key in self.entries:
+            self.remove(item)
+        entry = [self.counter, item, tuple(rect), self.cells_for(rect)]
+        self.counter += 1
+        self.entries[key] = entry
+        for cell in entry[3]:
+            self.cells.setdefault(cell, {})[key] = entry
+
+    def remove(self, item):
+        entry = self.entries.pop(id(item), None)
+        if entry is None:
+            return False
+        for cell in entry[3]:
+            bucket = self.cells[cell]
+            del bucket[id(item)]
+            if not bucket:
+                del self.cells[cell]
+        return True
+
+    def move(self, item, rect):
+        """
+        update an item's rect, keeping its place in the order. cheap when it stays in the same cells.
+        """
+        entry = self.entries.get(id(item))
+        if entry is None:
+            self.insert(item, rect)
+            return
+        entry[2] = tuple(rect)
+        cells = self.cells_for(rect)
+        if cells != entry[3]:
+            key = id(item)
+            for cell in entry[3]:
+                bucket = self.cells[cell]
+                del bucket[key]
+                if not bucket:
+                    del self.cells[cell]
+            entry[3] = cells
+            for cell in cells:
+                self.cells.setdefault(cell, {})[key] = entry
+
+    def clear(self):
+        self.cells = {}
+        self.entries = {}
+        self.counter = 0
+
+    def query(self, rect):
+        """
+        every item whose rect overlaps rect (x, y, w, h), in the order they were inserted.
+        """
+        found = {}
+        for cell in self.cells_for(rect):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        right, bottom = rect[0] + rect[2], rect[1] + rect[3]
+        hits = [entry for entry in found.values() if entry[2][0] < right and entry[2][0] + entry[2][2] > rect[0] and entry[2][1] < bottom and entry[2][1] + entry[2][3] > rect[1]]
+        hits.sort(key=lambda entry: entry[0])
+        return [entry[1] for entry in hits]
+
+    def query_point(self, pos):
+        bucket = self.cells.get((int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)))
+        if not bucket:
+            return []
+        hits = [entry for entry in bucket.values() if entry[2][0] <= pos[0] < entry[2][0] + entry[2][2] and entry[2][1] <= pos[1] < entry[2][1] + entry[2][3]]
+        hits.sort(key=lambda entry: entry[0])
+        return [entry[1] for entry in hits]
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,31 @@
+import zlib
+import pickle
+
+
+class GameState:
+    """
+    everything Game.snapshot() needs to put the simulation back exactly where it was. the entities are
+    packed bytes, particles, sparks and projectiles are copies of just their live array rows, so taking one
+    every frame is cheap. dumps() and loads() turn it into bytes and back for keeping on disk.
+    """
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def dumps(self):
+        return zlib.compress(pickle.dumps(self.__dict__, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def loads(cls, data):
+        return cls(**pickle.loads(zlib.decompress(data)))
+
+    def save(self, path):
+        f = open(path, 'wb')
+        f.write(self.dumps())
+        f.close()
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+        return cls.loads(data)
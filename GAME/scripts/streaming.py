@@ -0,0 +1,167 @@
+from array import array
+from concurrent import futures
+
+import pygame
+
+EVICT_AFTER = 120           # ticks a chunk outside the camera radius stays loaded after anything last used it.
+EVICT_EVERY = 30            # ticks between looking for chunks to drop.
+
+
+class ChunkStreamer:
+    """
+    keeps only part of a binary map (scripts/mapfile.py) loaded in a tilemap: the chunks within radius
+    chunks of the camera, plus any chunk something is still using (an enemy walking around off screen).
+    chunks ahead of the camera are read on a background thread before they're needed, chunks nothing has
+    used for a while are dropped again. edited chunks keep their edits when they're dropped.
+    """
+    def __init__(self, tilemap, map_file, physics_tiles, radius=3, chunk_shift=4):
+        self.tilemap = tilemap
+        self.map_file = map_file
+        self.physics_tiles = physics_tiles
+        self.radius = radius
+        self.chunk_shift = chunk_shift
+        self.chunk_px = tilemap.tile_size << chunk_shift
+        self.ids = [0] + [tilemap.store.type_id(name) for name in map_file.type_names[1:]]      # file type id -> store type id.
+        self.same_ids = self.ids == list(range(len(self.ids)))
+        self.resident = set()           # chunks of the map that are in the store right now.
+        self.used = {}                  # chunk -> tick anything last needed it.
+        self.edited = {}                # chunks changed and then dropped, these win over the file when loaded again.
+        self.modified = set()           # loaded chunks changed since they were loaded.
+        self.pending = {}               # chunk -> future of its cells from the prefetch thread.
+        self.pool = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='chunks')
+        self.tick = 0
+        self.center = None
+        self.last_scroll = None
+
+    def read(self, loc):
+        """
+        a chunk's cells in the store's type ids, from the edits or the file. safe to run on the prefetch thread.
+        """
+        if loc in self.edited:
+            return array('H', self.edited[loc])
+        cells = self.map_file.chunk(loc)
+        if cells is not None and not self.same_ids:
+            ids = self.ids
+            cells = array('H', [(ids[value >> 8] << 8) | (value & 0xFF) if value else 0 for value in cells])
+        return cells
+
+    def install(self, loc, cells):
+        tilemap = self.tilemap
+        self.resident.add(loc)
+        self.used[loc] = self.tick
+        if cells is None:
+            return
+        tilemap.store.put_chunk(loc, cells)
+        type_names, tile_size, solid_rects, physics_tiles = tilemap.store.type_names, tilemap.tile_size, tilemap.solid_rects, self.physics_tiles
+        base_x, base_y = loc[0] << self.chunk_shift, loc[1] << self.chunk_shift
+        size = 1 << self.chunk_shift
+        for i, value in enumerate(cells):
+            if value and type_names[value >> 8] in physics_tiles:
+                x, y = base_x + i % size, base_y + i // size
+                solid_rects[(x, y)] = pygame.Rect(x * tile_size, y * tile_size, tile_size, tile_size)
+        tilemap.chunk_cache.discard(loc)
+
+    def evict(self, loc):
+        tilemap = self.tilemap
+        cells = tilemap.store.take_chunk(loc)
+        if loc in self.modified:
+            self.edited[loc] = cells if cells is not None else array('H', bytes(2 << (2 * self.chunk_shift)))
+            self.modified.discard(loc)
+        size = 1 << self.chunk_shift
+        base_x, base_y = loc[0] << self.chunk_shift, loc[1] << self.chunk_shift
+        for y in range(base_y, base_y + size):
+            for x in range(base_x, base_x + size):
+                tilemap.solid_rects.pop((x, y), None)
+        tilemap.chunk_cache.discard(loc)
+        self.resident.discard(loc)
+        self.used.pop(loc, None)
+
+    def known(self, loc):
+        return loc in self.map_file.chunk_offsets or loc in self.edited
+
+    def need(self, loc):
+        """
+        make sure a chunk is loaded, right now if it has to be. called by everything that looks at tiles.
+        """
+        if loc not in self.resident:
+            future = self.pending.pop(loc, None)
+            self.install(loc, future.result() if future else self.read(loc))
+        else:
+            self.used[loc] = self.tick
+
+    def need_area(self, left, top, right, bottom):
+        chunk_px = self.chunk_px
+        left, top, right, bottom = int(left // chunk_px), int(top // chunk_px), int(right // chunk_px), int(bottom // chunk_px)
+        if left == right and top == bottom:         # nearly always, an entity is much smaller than a chunk.
+            loc = (left, top)
+            if loc in self.resident:
+                self.used[loc] = self.tick
+            else:
+                self.need(loc)
+            return
+        for cy in range(top, bottom + 1):
+            for cx in range(left, right + 1):
+                self.need((cx, cy))
+
+    def changed(self, tile_pos):
+        """
+        a tile is about to be set or removed, load its chunk and remember it's different from the file now.
+        """
+        loc = (int(tile_pos[0]) >> self.chunk_shift, int(tile_pos[1]) >> self.chunk_shift)
+        self.need(loc)
+        self.modified.add(loc)
+
+    def around(self, center):
+        return {(center[0] + dx, center[1] + dy) for dy in range(-self.radius, self.radius + 1) for dx in range(-self.radius, self.radius + 1)}
+
+    def update(self, scroll, view_size):
+        """
+        once a tick with the camera: load what's around it, prefetch where it's heading, drop what nothing uses.
+        """
+        self.tick += 1
+        center = (int(scroll[0] + view_size[0] / 2) // self.chunk_px, int(scroll[1] + view_size[1] / 2) // self.chunk_px)
+        heading = (0, 0)
+        if self.last_scroll:
+            heading = ((scroll[0] > self.last_scroll[0]) - (scroll[0] < self.last_scroll[0]), (scroll[1] > self.last_scroll[1]) - (scroll[1] < self.last_scroll[1]))
+        self.last_scroll = (scroll[0], scroll[1])
+
+        if center != self.center:
+            for loc in self.around(center):
+                if self.known(loc):
+                    self.need(loc)
+
+        if center != self.center or self.pending:
+            self.center = center
+            # a radius' worth further along the way the camera is moving gets read in the background.
+            for loc in self.around((center[0] + heading[0] * self.radius, center[1] + heading[1] * self.radius)):
+                if loc not in self.resident and loc not in self.pending and self.known(loc):
+                    self.pending[loc] = self.pool.submit(self.read, loc)
+            for loc in [loc for loc, future in self.pending.items() if future.done()]:
+                self.install(loc, self.pending.pop(loc).result())
+
+        if not self.tick % EVICT_EVERY:
+            keep = self.around(center)
+            for loc in [loc for loc in self.resident if loc not in keep and self.tick - self.used.get(loc, 0) > EVICT_AFTER]:
+                self.evict(loc)
+
+    def items(self):
+        """
+        every filled cell of the whole map as (x, y, packed value), loaded or not, without loading anything.
+        chunks go row by row so the order, and so the order spawners come out of extract, is always the same.
+        """
+        size = 1 << self.chunk_shift
+        for loc in sorted(set(self.map_file.chunk_offsets) | set(self.edited) | self.resident, key=lambda loc: (loc[1], loc[0])):
+            cells = self.tilemap.store.chunks.get(loc) if loc in self.resident else self.read(loc)
+            if cells is None:
+                continue
+            for i, value in enumerate(cells):
+                if value:
+                    yield (loc[0] << self.chunk_shift) + i % size, (loc[1] << self.chunk_shift) + i // size, value
+
+    def load_all(self):
+        for loc in set(self.map_file.chunk_offsets) | set(self.edited):
+            self.need(loc)
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.map_file.close()
@@ -1,8 +1,16 @@
 import json
 import math
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
 
+import numpy as np
 import pygame
 
+from scripts.spatial import SpatialGrid
+from scripts.mapfile import MapFile, write_map
+from scripts.streaming import ChunkStreamer
+
 # what tile variants should be used depending on neighbor locations
 # running sorted makes the list the same order to accomodate the loop
 # in autotile. list can't be used as a key, so it is made into a tuple.
@@ -22,22 +30,406 @@ NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1)
 PHYSICS_TILES = {'grass', 'stone', 'castle', 'pipe', 'yellowblock'}          # sets are faster than lists for accessing.
 AUTOTILE_TYPES = {'grass', 'stone'}
 
+# the same table as AUTOTILE_MAP by bit mask, one bit for each side with a tile of the same type.
+# AUTOTILE_VARIANTS[mask] is the variant, or -1 where AUTOTILE_MAP has nothing and the tile is left alone.
+AUTOTILE_SIDES = [(1, 0), (-1, 0), (0, -1), (0, 1)]
+AUTOTILE_VARIANTS = [-1] * (1 << len(AUTOTILE_SIDES))
+for neighbors, variant in AUTOTILE_MAP.items():
+    AUTOTILE_VARIANTS[sum(1 << AUTOTILE_SIDES.index(side) for side in neighbors)] = variant
+
+# on grid tiles live in chunks of CHUNK_SIZE x CHUNK_SIZE cells. A chunk is only allocated once a tile is placed in it,
+# so a huge map that is mostly empty only pays for the chunks that actually have something in them.
+CHUNK_SHIFT = 4
+CHUNK_SIZE = 1 << CHUNK_SHIFT       # 16 tiles
+CHUNK_MASK = CHUNK_SIZE - 1
+MAX_TYPE_ID = 255           # a cell has a byte for the type id and a byte for the variant.
+MAX_VARIANT = 255
+
+CHUNK_CACHE_LIMIT = 32 * 1024 * 1024        # bytes of pre-rendered chunk surfaces to keep around before the least recently drawn ones are dropped.
+
+
+class TileStore:
+    """
+    Integer indexed storage for the on grid tiles.
+    each cell is a single 16 bit number, the top byte is the type id (0 means empty)
+    and the bottom byte is the variant, so looking up a tile is one dict probe for
+    the chunk plus one array index, no strings or per tile dicts.
+    """
+    def __init__(self):
+        self.type_names = [None]        # type id -> type name, id 0 is reserved for empty cells.
+        self.type_ids = {}              # type name -> type id
+        self.chunks = {}                # (chunk x, chunk y) -> array of CHUNK_SIZE * CHUNK_SIZE packed cells
+        self.counts = {}                # (chunk x, chunk y) -> how many cells in the chunk are filled, so empty chunks can be freed.
+        self.size = 0
+        self.shared = set()             # chunks whose arrays a level snapshot also holds, copied before the first write. see scripts/levelcache.py
+
+    def type_id(self, tile_type):
+        if tile_type not in self.type_ids:
+            if len(self.type_names) > MAX_TYPE_ID:
+                raise ValueError('too many tile types, a map can only have ' + str(MAX_TYPE_ID) + ", can't add " + repr(tile_type))
+            self.type_ids[tile_type] = len(self.type_names)
+            self.type_names.append(tile_type)
+        return self.type_ids[tile_type]
+
+    def get(self, x, y):
+        """
+        packed value of the cell at tile coordinates x, y, 0 if there is no tile there.
+        >> and & floor towards negative infinity so negative coordinates land in the right chunk.
+        """
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0
+        return chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def pack(self, tile_type, variant):
+        """
+        the cell value for a tile, checked so a big variant can't spill into the type id.
+        """
+        if not 0 <= variant <= MAX_VARIANT:
+            raise ValueError('tile variant ' + str(variant) + ' of ' + repr(tile_type) + ' is out of range, variants go from 0 to ' + str(MAX_VARIANT))
+        return (self.type_id(tile_type) << 8) | variant
+
+    def set(self, x, y, tile_type, variant):
+        value = self.pack(tile_type, variant)
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if key in self.shared:
+            chunk = self.unshare(key)
+        if chunk is None:
+            chunk = self.chunks[key] = array('H', bytes(2 * CHUNK_SIZE * CHUNK_SIZE))
+            self.counts[key] = 0
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if not chunk[i]:
+            self.counts[key] += 1
+            self.size += 1
+        chunk[i] = value
+
+    def remove(self, x, y):
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return False
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if not chunk[i]:
+            return False
+        if key in self.shared:
+            chunk = self.unshare(key)
+        chunk[i] = 0
+        self.size -= 1
+        self.counts[key] -= 1
+        if not self.counts[key]:            # nothing left in the chunk, give the memory back.
+            del self.chunks[key]
+            del self.counts[key]
+        return True
+
+    def clear(self):
+        self.chunks = {}
+        self.counts = {}
+        self.size = 0
+        self.shared = set()
+
+    def unshare(self, key):
+        """
+        give this store its own copy of a chunk it shares with a snapshot, before writing to it.
+        """
+        self.shared.discard(key)
+        chunk = self.chunks[key] = array('H', self.chunks[key])
+        return chunk
+
+    def snapshot(self):
+        """
+        (chunks, counts, size) to hand back to restore() later. nothing is copied, the chunk arrays
+        are shared until one side writes to them.
+        """
+        self.shared = set(self.chunks)
+        return dict(self.chunks), dict(self.counts), self.size
+
+    def restore(self, snapshot):
+        chunks, counts, self.size = snapshot
+        self.chunks = dict(chunks)
+        self.counts = dict(counts)
+        self.shared = set(chunks)
+
+    def take_chunk(self, key):
+        """
+        remove a whole chunk and hand back its cells, None if there was nothing in it.
+        """
+        self.size -= self.counts.pop(key, 0)
+        self.shared.discard(key)
+        return self.chunks.pop(key, None)
+
+    def put_chunk(self, key, chunk):
+        """
+        drop a whole chunk of packed cells in at once, cells that use this store's type ids.
+        """
+        count = len(chunk) - chunk.count(0)
+        self.size += count - self.counts.get(key, 0)
+        self.shared.discard(key)
+        if count:
+            self.chunks[key] = chunk
+            self.counts[key] = count
+        else:
+            self.chunks.pop(key, None)
+            self.counts.pop(key, None)
+
+    def items(self):
+        """
+        every filled cell as (x, y, packed value), chunk by chunk.
+        """
+        for (cx, cy), chunk in list(self.chunks.items()):
+            for i, value in enumerate(chunk):
+                if value:
+                    yield (cx << CHUNK_SHIFT) | (i & CHUNK_MASK), (cy << CHUNK_SHIFT) | (i >> CHUNK_SHIFT), value
+
+    def __len__(self):
+        return self.size
+
+
+class TileView(MutableMapping):
+    """
+    The old 'x;y' -> {'type', 'variant', 'pos'} dictionary, built on the fly from the TileStore
+    so the json format and older code (editor, extract) keep working. Tiles handed out are fresh
+    dicts, so changing one does not change the map, set it back through the view instead.
+    """
+    def __init__(self, tilemap):
+        self.tilemap = tilemap
+
+    def _loc(self, key):
+        x, y = key.split(';')
+        return int(x), int(y)
+
+    def __getitem__(self, key):
+        try:
+            tile = self.tilemap.get_tile(self._loc(key))
+        except ValueError:
+            tile = None
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __setitem__(self, key, tile):
+        self.tilemap.set_tile(self._loc(key), tile['type'], tile['variant'])
+
+    def __delitem__(self, key):
+        if not self.tilemap.remove_tile(self._loc(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            return bool(self.tilemap.store.get(*self._loc(key)))
+        except (ValueError, AttributeError):
+            return False
+
+    def __iter__(self):
+        for x, y, value in self.tilemap.store.items():
+            yield str(x) + ';' + str(y)
+
+    def __len__(self):
+        return len(self.tilemap.store)
+
+
+class ChunkCache:
+    """
+    Pre-rendered surfaces of whole chunks, so a frame blits a handful of big surfaces
+    instead of every visible tile. Kept in least recently used order and trimmed to a byte limit.
+    Anything that changes a tile has to mark its chunk dirty, see Tilemap.mark_dirty.
+    """
+    def __init__(self, limit=CHUNK_CACHE_LIMIT):
+        self.limit = limit
+        self.surfaces = OrderedDict()       # (chunk x, chunk y) -> surface, oldest first.
+        self.bytes = 0
+
+    def get(self, key):
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)      # most recently used goes to the back, eviction pops from the front.
+        return surf
+
+    def put(self, key, surf):
+        self.discard(key)
+        self.surfaces[key] = surf
+        self.bytes += surf.get_width() * surf.get_height() * surf.get_bytesize()
+        while self.bytes > self.limit and len(self.surfaces) > 1:
+            old_key, old_surf = self.surfaces.popitem(last=False)
+            self.bytes -= old_surf.get_width() * old_surf.get_height() * old_surf.get_bytesize()
+
+    def discard(self, key):
+        surf = self.surfaces.pop(key, None)
+        if surf is not None:
+            self.bytes -= surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+    def clear(self):
+        self.surfaces.clear()
+        self.bytes = 0
+
 
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {}               # every single tile on a grid, handle all physics here to keep optimization easy.
+        self.store = TileStore()        # every single tile on a grid, handle all physics here to keep optimization easy.
         self.offgrid_tiles = []         # these are things placed all over the place but dont line up with the grid.
+        self.offgrid_index = SpatialGrid(cell_size=128)         # offgrid tiles filed by area, for only drawing what's on camera and for finding what's under the mouse.
+        self.chunk_cache = ChunkCache()
+        self.solid_rects = {}           # (tile x, tile y) -> pygame.Rect for every physics tile, made once at load instead of every frame.
+        self.ring_offsets = {}          # entity size -> offsets of the tiles around it, see bounding_box.
+        self.nearby_rects = []          # handed back by physics_rects_around and refilled on every call, so no new list each time.
+        self.overhang = None            # how far the biggest tile image sticks out past its grid cell, worked out on first render.
+        self.streamer = None            # set when a map is loaded with a stream radius, then only the chunks near the camera are in the store.
+        self.changed_chunks = None      # the editor makes this a set to hear which chunks changed, it only redraws those.
+
+    @property
+    def tilemap(self):
+        """
+        dictionary style view of the grid for the json format and the editor, the hot paths use self.store directly.
+        """
+        return TileView(self)
+
+    def get_tile(self, tile_pos):
+        value = self.store.get(tile_pos[0], tile_pos[1])
+        if value:
+            return {'type': self.store.type_names[value >> 8], 'variant': value & 0xFF, 'pos': [tile_pos[0], tile_pos[1]]}
+
+    def set_tile(self, tile_pos, tile_type, variant):
+        if self.streamer:
+            self.streamer.changed(tile_pos)
+        if tile_type not in self.store.type_ids:
+            self.overhang = None            # new kind of tile, its images might be bigger than the ones we've seen.
+        before = self.store.get(int(tile_pos[0]), int(tile_pos[1]))
+        self.store.set(int(tile_pos[0]), int(tile_pos[1]), tile_type, variant)
+        if self.store.get(int(tile_pos[0]), int(tile_pos[1])) != before:       # holding the mouse down in the editor keeps setting the same tile, only redraw on real changes.
+            self.mark_dirty(tile_pos)
+            self.refresh_solid(tile_pos)
+
+    def remove_tile(self, tile_pos):
+        if self.streamer:
+            self.streamer.changed(tile_pos)
+        if self.store.remove(int(tile_pos[0]), int(tile_pos[1])):
+            self.mark_dirty(tile_pos)
+            self.refresh_solid(tile_pos)
+            return True
+        return False
+
+    def refresh_solid(self, tile_pos):
+        """
+        keep the collision rect for one cell in step with the store after it changes.
+        """
+        x, y = int(tile_pos[0]), int(tile_pos[1])
+        value = self.store.get(x, y)
+        if value and self.store.type_names[value >> 8] in PHYSICS_TILES:
+            if (x, y) not in self.solid_rects:
+                self.solid_rects[(x, y)] = pygame.Rect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
+        else:
+            self.solid_rects.pop((x, y), None)
+
+    def set_tiles(self, positions, tile_type, variant):
+        """
+        set_tile for a lot of tiles at once, for the editor's brushes. every chunk touched is only marked dirty
+        once, at the end. returns the positions that actually changed.
+        """
+        store = self.store
+        if tile_type not in store.type_ids:
+            self.overhang = None
+        value = store.pack(tile_type, variant)
+        solid = tile_type in PHYSICS_TILES
+        changed = []
+        for pos in positions:
+            x, y = int(pos[0]), int(pos[1])
+            if self.streamer:
+                self.streamer.changed((x, y))
+            if store.get(x, y) == value:
+                continue
+            store.set(x, y, tile_type, variant)
+            changed.append((x, y))
+            if solid:
+                if (x, y) not in self.solid_rects:
+                    self.solid_rects[(x, y)] = pygame.Rect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
+            else:
+                self.solid_rects.pop((x, y), None)
+        self.mark_chunks_dirty({(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) for x, y in changed})
+        return changed
+
+    def remove_tiles(self, positions):
+        changed = []
+        for pos in positions:
+            x, y = int(pos[0]), int(pos[1])
+            if self.streamer:
+                self.streamer.changed((x, y))
+            if self.store.remove(x, y):
+                self.solid_rects.pop((x, y), None)
+                changed.append((x, y))
+        self.mark_chunks_dirty({(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) for x, y in changed})
+        return changed
+
+    def rebuild_solids(self):
+        self.solid_rects = {}
+        for x, y, value in self.store.items():
+            if self.store.type_names[value >> 8] in PHYSICS_TILES:
+                self.solid_rects[(x, y)] = pygame.Rect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
+
+    def mark_dirty(self, tile_pos):
+        """
+        throw away the pre-rendered chunk holding this tile so it gets redrawn next render.
+        set_tile and remove_tile already do this, anything writing to self.store directly has to call it.
+        """
+        self.mark_chunks_dirty([(int(tile_pos[0]) >> CHUNK_SHIFT, int(tile_pos[1]) >> CHUNK_SHIFT)])
+
+    def mark_chunks_dirty(self, chunk_locs):
+        for loc in chunk_locs:
+            self.chunk_cache.discard(loc)
+        if self.changed_chunks is not None:
+            self.changed_chunks.update(chunk_locs)
+
+    def mark_all_dirty(self):
+        self.chunk_cache.clear()
+        self.overhang = None
+
+    def offgrid_rect(self, tile):
+        if tile['type'] not in self.game.assets:        # the game doesn't load spawner images, those get pulled out by extract before anything is drawn.
+            return (tile['pos'][0], tile['pos'][1], self.tile_size, self.tile_size)
+        img = self.game.assets[tile['type']][tile['variant']]
+        return (tile['pos'][0], tile['pos'][1], img.get_width(), img.get_height())
+
+    def add_offgrid(self, tile):
+        self.offgrid_tiles.append(tile)
+        self.offgrid_index.insert(tile, self.offgrid_rect(tile))
+
+    def remove_offgrid(self, tile):
+        self.offgrid_index.remove(tile)
+        for i, other in enumerate(self.offgrid_tiles):
+            if other is tile:           # by identity, two identical decorations stacked on each other are still separate tiles.
+                del self.offgrid_tiles[i]
+                break
+
+    def offgrid_at(self, pos):
+        """
+        offgrid tiles whose image covers a pixel position, for deleting in the editor.
+        """
+        return self.offgrid_index.query_point(pos)
+
+    def reindex_offgrid(self):
+        self.offgrid_index.clear()
+        for tile in self.offgrid_tiles:
+            self.offgrid_index.insert(tile, self.offgrid_rect(tile))
 
     def solid_check(self, pos):
         """
         for enemies, finding out if the tile is actually solid to walk on, so they don't walk off the edge.
         """
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if self.streamer:
+            self.streamer.need((tile_loc[0] >> CHUNK_SHIFT, tile_loc[1] >> CHUNK_SHIFT))
+        if tile_loc in self.solid_rects:
+            return self.get_tile(tile_loc)
+
+    def is_solid(self, pos):
+        """
+        same as solid_check but just True or False, for code that runs every frame and doesn't need the tile itself.
+        """
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if self.streamer:
+            self.streamer.need((tile_loc[0] >> CHUNK_SHIFT, tile_loc[1] >> CHUNK_SHIFT))
+        return tile_loc in self.solid_rects
 
     def extract(self, id_pairs, keep=False):        # tiles are in type and variance format, this is an 'id_pair'.
         """
@@ -48,97 +440,303 @@ class Tilemap:
             if (tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
+                    self.remove_offgrid(tile)
 
         notkeep = []
-        for loc in self.tilemap:                        # for ongrid tiles.
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()      # we want to convert from tile coordinates to actual pixels.
-                matches[-1]['pos'][0] *= self.tile_size             # ths gives us pixel coordinates. we are copying so we don't modify actual tile data on the map with this function.
-                matches[-1]['pos'][1] *= self.tile_size
+        for x, y, value in (self.streamer.items() if self.streamer else self.store.items()):           # for ongrid tiles, streaming looks through the whole map not just what's loaded.
+            if (self.store.type_names[value >> 8], value & 0xFF) in id_pairs:
+                # we want to convert from tile coordinates to actual pixels, ths gives us pixel coordinates.
+                matches.append({'type': self.store.type_names[value >> 8], 'variant': value & 0xFF, 'pos': [x * self.tile_size, y * self.tile_size]})
                 if not keep:
-                    notkeep.append(loc)
-                    # del self.tilemap[loc]
+                    notkeep.append((x, y))
         for loc in notkeep:
-            del self.tilemap[loc]
+            self.remove_tile(loc)
 
         return matches
 
     def tiles_around(self, pos, entity_size):
-        """tiles = []
-        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))      # integer truncates decimal values, so use // not /, int() is used so we can use it later for indexing. Converts pixel position into grid position.
-        for offset in NEIGHBOR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])           # location to check if neighbors exist
-            if check_loc in self.tilemap:          # tilemap can have a lot of empty spaces with no entries, so check if the tile is in the tilemap to begin with.
-                tiles.append(self.tilemap[check_loc])
+        if self.streamer:
+            self.streamer.need_area(pos[0] - self.tile_size, pos[1] - self.tile_size, pos[0] + entity_size[0] + self.tile_size, pos[1] + entity_size[1] + self.tile_size)
+        tiles = []
+        for tile_loc in self.bounding_box(pos, entity_size):
+            tile = self.get_tile(tile_loc)
+            if tile:
+                tiles.append(tile)
         return tiles
+
+    def bounding_box(self, pos, entity_size):
+        """
+        tile coordinates of the ring of tiles just outside an entity, the tiles it could run into this frame.
         """
-        tiles = []
-        bounding_box = []
-        x, y = math.ceil(entity_size[0] / self.tile_size), math.ceil(entity_size[1]/ self.tile_size)    #finding out how tall and wide in tiles our entity is, tiles are 16x16, use ceiling for half tile values so they are included.
-        # tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         top_left_x = int(round(pos[0] / self.tile_size))-1
         top_left_y = int(round(pos[1] / self.tile_size))-1
-        for i in range(x+2):        # Trace outside tiles starting in top left going down and to right.
-            bounding_box.append((top_left_x+i, top_left_y))                    # Top Row
-            bounding_box.append((top_left_x+i, top_left_y+y+1))   # Bottom Row
-        for i in range(1, y+1):
-            bounding_box.append((top_left_x, top_left_y+i))                    # Left Side
-            bounding_box.append((top_left_x+x+1, top_left_y+i))   # Right Side
-        for tile in bounding_box:
-            check_loc = str(tile[0]) + ';' + str(tile[1])
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
-        return tiles
+        return [(top_left_x + dx, top_left_y + dy) for dx, dy in self.ring_around(entity_size)]
+
+    def ring_around(self, entity_size):
+        """
+        offsets from the top left of the ring to each tile in it, only depends on the entity's size so it's worked out once per size.
+        """
+        key = (entity_size[0], entity_size[1])
+        ring = self.ring_offsets.get(key)
+        if ring is None:
+            ring = []
+            x, y = math.ceil(entity_size[0] / self.tile_size), math.ceil(entity_size[1]/ self.tile_size)    #finding out how tall and wide in tiles our entity is, tiles are 16x16, use ceiling for half tile values so they are included.
+            for i in range(x+2):        # Trace outside tiles starting in top left going down and to right.
+                ring.append((i, 0))                    # Top Row
+                ring.append((i, y+1))   # Bottom Row
+            for i in range(1, y+1):
+                ring.append((0, i))                    # Left Side
+                ring.append((x+1, i))   # Right Side
+            self.ring_offsets[key] = ring
+        return ring
 
     def save(self, path):
+        """
+        a path ending in .map saves the binary format (scripts/mapfile.py), anything else saves json.
+        """
+        self.stop_streaming()           # saving writes the whole map, so it all has to be loaded.
+        if path.endswith('.map'):
+            write_map(path, self.tile_size, CHUNK_SHIFT, self.store.type_names, self.store.chunks, self.offgrid_tiles)
+            return
         f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
+        json.dump({'tilemap': dict(self.tilemap), 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
         f.close()
 
-    def load(self, path):
-        f = open(path, 'r')
-        map_data = json.load(f)
-        f.close()
+    def load(self, path, stream_radius=None, map_data=None):
+        """
+        with a stream_radius (in chunks) a binary map isn't loaded all at once, see stream_update. json maps always load whole.
+        map_data is a json map that's already been parsed, then the file isn't read again.
+        """
+        if self.streamer:
+            self.streamer.close()
+            self.streamer = None
+        self.store.clear()
+        self.solid_rects = {}
+        self.chunk_cache = ChunkCache()         # a new one, not cleared, a level snapshot may still be holding the old one.
+        if path.endswith('.map') and stream_radius:
+            map_file = MapFile(path)
+            self.tile_size = map_file.tile_size
+            self.offgrid_tiles = map_file.offgrid()         # offgrid tiles are few and small, they stay loaded.
+            self.streamer = ChunkStreamer(self, map_file, PHYSICS_TILES, stream_radius, CHUNK_SHIFT)
+        elif path.endswith('.map'):
+            self.load_binary(path)
+        else:
+            if map_data is None:
+                f = open(path, 'r')
+                map_data = json.load(f)
+                f.close()
+            for tile in map_data['tilemap'].values():
+                self.store.set(int(tile['pos'][0]), int(tile['pos'][1]), tile['type'], tile['variant'])
+            self.tile_size = map_data['tile_size']
+            self.offgrid_tiles = map_data['offgrid']
+        self.ring_offsets = {}
+        if not self.streamer:
+            self.rebuild_solids()
+        self.reindex_offgrid()
+        self.mark_all_dirty()
 
-        self.tilemap = map_data['tilemap']
-        self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+    def load_binary(self, path):
+        """
+        chunks are copied straight out of the file, only the type ids need changing if they don't line up with the store's.
+        """
+        map_file = MapFile(path)
+        ids = [0] + [self.store.type_id(name) for name in map_file.type_names[1:]]
+        if map_file.chunk_shift != CHUNK_SHIFT:
+            for x, y, tile_type, variant in map_file.tiles():
+                self.store.set(x, y, tile_type, variant)
+        else:
+            same_ids = ids == list(range(len(ids)))
+            for loc in map_file.chunk_offsets:
+                chunk = map_file.chunk(loc)
+                if not same_ids:
+                    chunk = array('H', [(ids[value >> 8] << 8) | (value & 0xFF) if value else 0 for value in chunk])
+                self.store.put_chunk(loc, chunk)
+        self.tile_size = map_file.tile_size
+        self.offgrid_tiles = map_file.offgrid()
+        map_file.close()
 
     def physics_rects_around(self, pos, size):
         """
-        get physics tiles and return pygame.rects on them for collision
+        get physics tiles and return pygame.rects on them for collision.
+        the rects are the cached ones from solid_rects and the list is reused between calls,
+        so use them straight away and don't change them.
         """
-        rects = []
-        for tile in self.tiles_around(pos, size):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))        
+        if self.streamer:
+            self.streamer.need_area(pos[0] - self.tile_size, pos[1] - self.tile_size, pos[0] + size[0] + self.tile_size, pos[1] + size[1] + self.tile_size)
+        rects = self.nearby_rects
+        rects.clear()
+        solid_rects = self.solid_rects
+        top_left_x = int(round(pos[0] / self.tile_size))-1
+        top_left_y = int(round(pos[1] / self.tile_size))-1
+        for dx, dy in self.ring_around(size):
+            rect = solid_rects.get((top_left_x + dx, top_left_y + dy))
+            if rect is not None:
+                rects.append(rect)
         return rects
 
+    def stream_update(self, scroll, view_size):
+        """
+        called every tick with the camera when streaming, keeps the chunks around it loaded.
+        """
+        if self.streamer:
+            self.streamer.update(scroll, view_size)
+
+    def stop_streaming(self):
+        """
+        load every chunk that's left and go back to having the whole map in memory.
+        """
+        if self.streamer:
+            self.streamer.load_all()
+            self.streamer.close()
+            self.streamer = None
+
+    def autotile_tile(self, x, y):
+        """
+        pick the variant for one tile from its four neighbors, the same answer autotile() gives for it.
+        writes the store directly, returns True if the variant changed so the caller can mark the chunk dirty.
+        """
+        store = self.store
+        value = store.get(x, y)
+        if not value or store.type_names[value >> 8] not in AUTOTILE_TYPES:
+            return False
+        mask = 0
+        for bit, shift in enumerate(AUTOTILE_SIDES):
+            check = store.get(x + shift[0], y + shift[1])
+            if check and (check >> 8) == (value >> 8):         # make sure tile is same type
+                mask |= 1 << bit
+        variant = AUTOTILE_VARIANTS[mask]
+        if variant == -1 or variant == value & 0xFF:
+            return False
+        if self.streamer:
+            self.streamer.changed((x, y))
+        store.set(x, y, store.type_names[value >> 8], variant)
+        return True
+
+    def autotile_around(self, tile_pos):
+        """
+        after placing or removing one tile only it and the four tiles next to it can need a different variant,
+        so the editor calls this instead of autotiling the whole map.
+        """
+        self.autotile_tiles([tile_pos])
+
+    def autotile_tiles(self, positions):
+        """
+        autotile_around for every position a brush changed, each tile is looked at once however many of its neighbors changed.
+        returns the positions whose variant changed.
+        """
+        cells = set()
+        for pos in positions:
+            x, y = int(pos[0]), int(pos[1])
+            cells.add((x, y))
+            for shift in AUTOTILE_SIDES:
+                cells.add((x + shift[0], y + shift[1]))
+        changed = [(x, y) for x, y in cells if self.autotile_tile(x, y)]
+        self.mark_chunks_dirty({(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT) for x, y in changed})
+        return changed
+
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:         # make sure tile is same type
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
+        """
+        autotile the whole map in one go, for imported and generated maps. every chunk is copied into one numpy
+        array with a border one cell wide taken from the chunks next to it, and the neighbor mask of every cell is
+        worked out at once. memory goes with how many chunks have tiles, not how far apart they are.
+        """
+        self.stop_streaming()
+        store = self.store
+        ids = [store.type_ids[name] for name in AUTOTILE_TYPES if name in store.type_ids]
+        if not store.chunks or not ids:
+            return
+        keys = list(store.chunks)
+        index = {key: i for i, key in enumerate(keys)}
+        empty = len(keys)           # chunks that aren't there read as this one, all empty cells.
+        cells = np.zeros((len(keys) + 1, CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint16)
+        cells[:-1] = np.frombuffer(b''.join(store.chunks[key].tobytes() for key in keys), dtype=np.uint16).reshape(-1, CHUNK_SIZE, CHUNK_SIZE)
+        left = [index.get((cx - 1, cy), empty) for cx, cy in keys]
+        right = [index.get((cx + 1, cy), empty) for cx, cy in keys]
+        above = [index.get((cx, cy - 1), empty) for cx, cy in keys]
+        below = [index.get((cx, cy + 1), empty) for cx, cy in keys]
+
+        # only the sides count for autotiling, so the border's corners stay empty.
+        grid = np.zeros((len(keys), CHUNK_SIZE + 2, CHUNK_SIZE + 2), dtype=np.uint16)
+        grid[:, 1:-1, 1:-1] = cells[:-1]
+        grid[:, 1:-1, 0] = cells[left, :, -1]
+        grid[:, 1:-1, -1] = cells[right, :, 0]
+        grid[:, 0, 1:-1] = cells[above, -1, :]
+        grid[:, -1, 1:-1] = cells[below, 0, :]
+
+        types = grid >> 8
+        inner = types[:, 1:-1, 1:-1]
+        mask = np.zeros(inner.shape, dtype=np.intp)
+        for bit, (dx, dy) in enumerate(AUTOTILE_SIDES):
+            side = types[:, 1 + dy:CHUNK_SIZE + 1 + dy, 1 + dx:CHUNK_SIZE + 1 + dx]
+            mask |= (side == inner).astype(np.intp) << bit         # empty cells are type 0 and never count, an empty cell's own mask doesn't matter.
+        variants = np.array(AUTOTILE_VARIANTS)[mask]
+        update = np.isin(inner, ids) & (variants != -1)
+        tiles = cells[:-1]
+        tiles[update] = (inner[update] << 8) | variants[update]
+
+        for i, key in enumerate(keys):
+            if not np.array_equal(tiles[i].ravel(), np.frombuffer(store.chunks[key], dtype=np.uint16)):
+                store.put_chunk(key, array('H', tiles[i].tobytes()))       # a fresh array, a level snapshot sharing the old one keeps it.
+        self.mark_all_dirty()
 
     def render(self, surf, offset=(0, 0)):
         # offgrid tiles, these are background, i.e. decoration, so render first. offset is for the camera and moves "everything else" to appear a camera is moving.
-        for tile in self.offgrid_tiles:                             # just needs to be in pixels, because it is off the grid, so no multiply by tilesize. Offset is negative for camera because camera movement is technically opposite of where world is moving.
-            surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-                        # this finds top left of camera, by adding surf.get_width, we find right side of screen, we add 1 because we're off by 1 with how the coordinates work.
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):     # y axis
-                loc = str(x) + ';' + str(y)     # location in tilemap dictionary, this is a str for when we load into level editor as JSON cause JSON handles string better.
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
\ No newline at end of file
+        # only the ones the index says overlap the camera get drawn, in the same order as the list.
+        assets = self.game.assets
+        offgrid_blits = []
+        for tile in self.offgrid_index.query((offset[0], offset[1], surf.get_width(), surf.get_height())):     # just needs to be in pixels, because it is off the grid, so no multiply by tilesize. Offset is negative for camera because camera movement is technically opposite of where world is moving.
+            offgrid_blits.append((assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1])))
+        surf.blits(offgrid_blits, doreturn=False)
+
+        tile_size = self.tile_size
+        chunk_px = CHUNK_SIZE * tile_size
+        overhang = self.tile_overhang()
+        # a chunk just above or left of the camera can still have big tiles hanging into view, so start that much further back.
+        chunk_blits = []
+        for cx in range((offset[0] - overhang[0]) // chunk_px, (offset[0] + surf.get_width()) // chunk_px + 1):
+            for cy in range((offset[1] - overhang[1]) // chunk_px, (offset[1] + surf.get_height()) // chunk_px + 1):
+                if (cx, cy) in self.store.chunks:
+                    chunk_blits.append((self.chunk_surface((cx, cy)), (cx * chunk_px - offset[0], cy * chunk_px - offset[1])))
+        surf.blits(chunk_blits, doreturn=False)
+
+    def tile_overhang(self):
+        """
+        how many pixels the largest tile image in use spills past the right and bottom of its grid cell.
+        """
+        if self.overhang is None:
+            overhang = [0, 0]
+            for tile_type in self.store.type_names[1:]:
+                for img in self.game.assets.get(tile_type, []):
+                    overhang[0] = max(overhang[0], img.get_width() - self.tile_size)
+                    overhang[1] = max(overhang[1], img.get_height() - self.tile_size)
+            self.overhang = tuple(overhang)
+        return self.overhang
+
+    def chunk_surface(self, chunk_loc):
+        """
+        cached picture of every tile in a chunk, drawn the first time it is needed and again after it is marked dirty.
+        """
+        surf = self.chunk_cache.get(chunk_loc)
+        if surf is None:
+            surf = self.render_chunk(chunk_loc)
+            self.chunk_cache.put(chunk_loc, surf)
+        return surf
+
+    def render_chunk(self, chunk_loc):
+        chunk = self.store.chunks[chunk_loc]
+        type_names = self.store.type_names
+        assets = self.game.assets
+        tile_size = self.tile_size
+        overhang = self.tile_overhang()
+        # black is the transparent color for every tile image, so a black colorkeyed chunk looks exactly like the tiles blitted one by one.
+        surf = pygame.Surface((CHUNK_SIZE * tile_size + overhang[0], CHUNK_SIZE * tile_size + overhang[1]))
+        surf.fill((0, 0, 0))
+        surf.set_colorkey((0, 0, 0))
+        tile_blits = []
+        for x in range(CHUNK_SIZE):         # column by column, same order tiles were always drawn in, so overlapping decor stacks the same way.
+            for y in range(CHUNK_SIZE):
+                value = chunk[(y << CHUNK_SHIFT) | x]     # packed type and variant, 0 means there's no tile here.
+                if value:
+                    tile_blits.append((assets[type_names[value >> 8]][value & 0xFF], (x * tile_size, y * tile_size)))
+        surf.blits(tile_blits, doreturn=False)
+        return surf
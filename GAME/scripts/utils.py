@@ -2,25 +2,53 @@ import os
 
 import pygame
 
+from scripts.atlas import Atlas
+
 BASE_IMG_PATH = 'data/images/'
 
+atlas = None            # the packed sheets from scripts/atlas.py, looked for on the first load.
+atlas_checked = False
+
+
+def get_atlas():
+    global atlas, atlas_checked
+    if not atlas_checked:
+        atlas_checked = True
+        atlas = Atlas.load(BASE_IMG_PATH)
+    return atlas
+
 
 def load_image(path):
+    packed = get_atlas() and atlas.image(path)
+    if packed:
+        return packed
     img = pygame.image.load(BASE_IMG_PATH + path).convert()         # .convert converts the internal representation of the image in pygame, making it more efficient for rendering, very important to use as default for everything
     img.set_colorkey((0, 0, 0))             # set black as transparent to get rid of png background of black
     return img
 
 
 def load_images(path):
+    names = get_atlas() and atlas.folder(path)
+    if names:
+        return [atlas.image(path + '/' + name) for name in names]
     images = []
     for img_name in sorted(os.listdir(BASE_IMG_PATH + path)):           # listdir lists all things in directory
         images.append(load_image(path + '/' + img_name))        # already includes base image path
     return images
 
 
+def flip_images(images):
+    """
+    mirrored copies of a list of frames, flipped horizontally like the entities do when they face left.
+    """
+    return [pygame.transform.flip(img, True, False) for img in images]
+
+
 class Animation:
-    def __init__(self, images, img_dur=5, loop=True, isPlayer=False):
+    def __init__(self, images, img_dur=5, loop=True, isPlayer=False, flipped_images=None):
         self.images = images
+        # mirrored frames are made once when the animation is loaded and shared by every copy, so rendering never has to flip anything.
+        self.flipped_images = flipped_images if flipped_images is not None else flip_images(images)
         self.isPlayer = isPlayer
         self.loop = loop
         self.img_duration = img_dur         # how many frames do we want each image in the animation to show for.
@@ -28,7 +56,7 @@ class Animation:
         self.frame = 0                      # frame of the game, not the animation.
 
     def copy(self):
-        return Animation(self.images, self.img_duration, self.loop, self.isPlayer)
+        return Animation(self.images, self.img_duration, self.loop, self.isPlayer, self.flipped_images)
 
     def update(self):
         if self.loop:
@@ -38,7 +66,9 @@ class Animation:
             if self.frame >= self.img_duration * len(self.images) - 1:                  # we've reached the end of the animation
                 self.done = True
 
-    def img(self):      # gives us image for whatever frame we are on.
+    def img(self, flip=False):      # gives us image for whatever frame we are on, flip=True gives the pre-made mirrored one.
         # if self.isPlayer:
             # print(f'IMAGE: {int(self.frame / self.img_duration)} FRAME: {self.frame}')
+        if flip:
+            return self.flipped_images[int(self.frame / self.img_duration)]
         return self.images[int(self.frame / self.img_duration)]     # int truncates the float.
\ No newline at end of file